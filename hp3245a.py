@@ -5,6 +5,7 @@ from __future__ import print_function
 import sys
 import time
 import prologix_usb
+import mread_util
 
 class hp3245a(prologix_usb.gpib_dev):
 
@@ -48,7 +49,10 @@ class hp3245a(prologix_usb.gpib_dev):
 
 	###############################################################
 	# Read a memory range using the undocumented MREAD command
-	# Return as a list of python 'int' [0...65535]
+	# Return as array('H')
+	#
+	# See mread_util.mread() for the fname, progress and chunk
+	# arguments, which allow big dumps to be resumed.
 	#
 	# ROMs are located at:		high/low byte
 	# 	0x000000-0x01ffff	U110 U111
@@ -61,17 +65,9 @@ class hp3245a(prologix_usb.gpib_dev):
 	#
 	# Other undocumented commands: MWRITE, MADDR, JSR & XYZZY
 	#
-	def mread(self, lo, hi):
+	def mread(self, lo, hi, fname=None, progress=None, chunk=1024):
 		self.AOK()
-		# Addresses must be even
-		assert lo & 1 == 0
-		assert hi & 1 == 0
-		l = list()
-		for i in range(lo, hi, 2):
-			j = int(self.ask("MREAD %d" % i))
-			if j < 0:
-				j = 65536 + j
-			l.append(j)
+		l = mread_util.mread(self, lo, hi, fname, progress, chunk)
 		self.AOK()
 		return l
 
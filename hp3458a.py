@@ -4,7 +4,15 @@ from __future__ import print_function
 
 import sys
 import time
+import array
+import pylt
 import prologix_usb
+import mread_util
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 class hp3458a(prologix_usb.gpib_dev):
 
@@ -47,6 +55,11 @@ class hp3458a(prologix_usb.gpib_dev):
 		self.wr("INBUF ON")
 		self.AOK()
 
+	def srq_enable(self, bits):
+		m = int(self.ask("RQS?"))
+		self.wr("RQS %d" % bits)
+		return m
+
 	#################
 	# HP3458A methods
 	#################
@@ -85,6 +98,60 @@ class hp3458a(prologix_usb.gpib_dev):
 		self.AOK()
 		print("ACAL ALL actual duration: %.1f" % (time.time() - t))
 
+	###############################################################
+	# Take n readings at full speed in binary format.
+	#
+	# Set up function, range and aperture first, (eg: "PRESET DIG").
+	#
+	# The readings go through reading memory (MEM FIFO) as SINT
+	# (16 bit) or DINT (32 bit), come out in one binary transfer
+	# and are scaled by ISCALE?.
+	#
+	# Returns a numpy array if numpy is available, else array('d')
+	#
+	# TARM and NRDGS are restored afterwards, output goes back to
+	# ASCII with END ALWAYS and reading memory off.
+	#
+	def acquire(self, n, fmt="SINT"):
+		w = {"SINT": 2, "DINT": 4}[fmt]
+		# Put trigger arm and count back the way we found them
+		tarm = self.ask("TARM?").strip()
+		nrdgs = self.ask("NRDGS?").strip()
+		try:
+			self.wr("TARM HOLD")
+			self.wr("MEM FIFO")
+			self.wr("MFORMAT " + fmt)
+			self.wr("OFORMAT " + fmt)
+			self.wr("NRDGS %d,AUTO" % n)
+			self.AOK()
+			scale = float(self.ask("ISCALE?"))
+			# EOI only after the last reading
+			self.wr("END ON")
+			self.wr("TARM SGL")
+			x = self.rd_bin(n * w)
+		finally:
+			self.wr("END ALWAYS")
+			self.wr("OFORMAT ASCII")
+			self.wr("MEM OFF")
+			self.wr("NRDGS " + nrdgs)
+			self.wr("TARM " + tarm)
+		if len(x) != n * w:
+			self.fail("Got %d of %d bytes" % (len(x), n * w))
+		self.AOK()
+		return self.decode(x, fmt, scale)
+
+	###############################################################
+	# Convert SINT/DINT readings to floats
+	def decode(self, x, fmt, scale):
+		if numpy != None:
+			t = {"SINT": ">i2", "DINT": ">i4"}[fmt]
+			return numpy.frombuffer(x, dtype=t) * scale
+		a = array.array({"SINT": "h", "DINT": "i"}[fmt])
+		pylt.arr_frombytes(a, bytes(x))
+		if sys.byteorder == "little":
+			a.byteswap()
+		return array.array('d', [i * scale for i in a])
+
 	####################
 	# HP3458A deep magic
 	####################
@@ -103,7 +170,10 @@ class hp3458a(prologix_usb.gpib_dev):
 
 	###############################################################
 	# Read a memory range using the undocumented MREAD command
-	# Return as a list of python 'int' [0...65535]
+	# Return as array('H')
+	#
+	# See mread_util.mread() for the fname, progress and chunk
+	# arguments, which allow big dumps to be resumed.
 	#
 	# ROMs are located at:		high/low byte
 	# 	0x000000-0x01ffff	U110 U111
@@ -116,19 +186,11 @@ class hp3458a(prologix_usb.gpib_dev):
 	#
 	# Other undocumented commands: MWRITE, MADDR, JSR & XYZZY
 	#
-	def mread(self, lo, hi):
+	def mread(self, lo, hi, fname=None, progress=None, chunk=1024):
 		self.AOK()
 		self.wr("TRIG HOLD")
 		self.wr("QFORMAT NUM")
-		# Addresses must be even
-		assert lo & 1 == 0
-		assert hi & 1 == 0
-		l = list()
-		for i in range(lo, hi, 2):
-			j = int(self.ask("MREAD %d" % i))
-			if j < 0:
-				j = 65536 + j
-			l.append(j)
+		l = mread_util.mread(self, lo, hi, fname, progress, chunk)
 		self.AOK()
 		return l
 
@@ -155,9 +217,8 @@ class hp3458a(prologix_usb.gpib_dev):
 
 	def nvram(self,  fname="_.hp3458.calram.bin"):
 		l=self.mread(0x60000, 0x60000 + 2048 * 2)
-		fo = open(fname, "w")
-		for i in l:
-			fo.write("%c" % (i >> 8))
+		fo = open(fname, "wb")
+		fo.write(bytearray([i >> 8 for i in l]))
 		fo.close()
 
 
@@ -2,9 +2,17 @@
 
 import sys
 import time
+import array
+import struct
 import prologix_usb
+import hpgl_util
 import subprocess
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
 class hp3577a(prologix_usb.gpib_dev):
 
 	def __init__(self, name = "gpib1", adr = 12):
@@ -40,6 +48,12 @@ class hp3577a(prologix_usb.gpib_dev):
 			x = self.rd()
 			if x[-5:] == ";SP0;":
 				break
+		if format == "svg":
+			hpgl_util.svg(x[4:], fname, "12415671", "24421111")
+			return
+		if format in ("png", "pbm"):
+			hpgl_util.raster(x[4:], fname, "12415671", "24421111")
+			return
 		p = subprocess.Popen([
 			"hp2xx",
 			"-m", format,
@@ -56,6 +70,52 @@ class hp3577a(prologix_usb.gpib_dev):
 		p.stdin.close()
 		p.wait()
 
+	#################
+	# HP3577A methods
+	#################
+
+	###############################################################
+	# Read trace n (1 or 2) in binary, FM2 (64 bit IEEE) format
+	#
+	# The dump is "#A", a 16 bit byte count and that many bytes of
+	# big-endian doubles, in the units of the display function.
+	# In polar and Smith formats, the values come in real/imag pairs.
+	#
+	# Returns (frequencies, values), numpy arrays if numpy is
+	# available, else array('d').  Set log=True for log sweeps.
+	#
+	def read_trace(self, n = 1, log = False):
+		fa = float(self.ask("FRA?"))
+		fb = float(self.ask("FRB?"))
+		self.wr("FM2;DT%d" % n)
+		try:
+			x = self.rd_block()
+		finally:
+			self.wr("FM1")
+		if len(x) < 4 or x[:2] != bytearray(b"#A"):
+			self.fail("HP3577A bad trace header")
+		l = (x[2] << 8) | x[3]
+		if len(x) != l + 4:
+			self.fail("HP3577A short trace (%d of %d)" % (len(x) - 4, l))
+		x = x[4:]
+		npts = l // 8
+		if numpy != None:
+			v = numpy.frombuffer(x, dtype=">f8").astype(float)
+			if log:
+				f = numpy.geomspace(fa, fb, npts)
+			else:
+				f = numpy.linspace(fa, fb, npts)
+			return f, v
+		v = array.array('d', struct.unpack(">%dd" % npts, bytes(x)))
+		f = array.array('d')
+		for i in range(npts):
+			r = i / max(npts - 1., 1.)
+			if log:
+				f.append(fa * (fb / fa) ** r)
+			else:
+				f.append(fa + (fb - fa) * r)
+		return f, v
+
 if __name__ == "__main__":
 	d = hp3577a()
 	print("Device reponds (%s)" % d.ask("ID?"))
@@ -4,6 +4,12 @@
 import sys
 import math
 import time
+import array
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 # Python Imports
 import prologix_usb
@@ -65,22 +71,92 @@ class hp5370b(prologix_usb.gpib_dev):
 		t = (n1n2/256. + n0 * q) * 5e-9
 		return t
 
+	###############################################################
+	# Decode a buffer of N*5 bytes of TB1 records in one go.
+	#
+	# Returns (t, bad) where t are the time intervals and bad is
+	# true where bintofloat() would have returned None, for those
+	# t is NaN.  With numpy these are float64 and bool arrays,
+	# otherwise array('d') and array('B').
+	#
+	def bintofloat_batch(self, x, erange=False):
+		if numpy == None:
+			t = array.array('d')
+			bad = array.array('B')
+			for i in range(0, len(x) - 4, 5):
+				v = self.bintofloat(x[i:i + 5], erange)
+				bad.append(v == None)
+				t.append(float("nan") if v == None else v)
+			return t, bad
+		b = numpy.frombuffer(x, dtype=numpy.uint8)
+		b = b[:len(b) - len(b) % 5].reshape(-1, 5).astype(numpy.int64)
+		b0 = b[:,0]
+		n1n2 = ((b0 & 3) << 16) | (b[:,1] << 8) | b[:,2]
+		n1n2 -= (n1n2 & (1<<17)) << 1
+		n0 = (b[:,3] << 8) | b[:,4]
+		bad = (b0 & 0x88) != 0
+		if erange:
+			n0 += (b0 & 0x04) << 14
+		else:
+			bad |= (b0 & 0x04) != 0
+		q = numpy.where(b0 & 0x20, 1.0, -1.0)
+		t = (n1n2 / 256. + n0 * q) * 5e-9
+		t[bad] = numpy.nan
+		return t, bad
+
+	###############################################################
+	# Streaming capture in TB1 mode.
+	#
+	# The counter keeps talking while we read many records per
+	# serial transfer (see prologix_usb.rd_records()).  The adapter
+	# puts a LF after each record, so garbled or lost records are
+	# spotted and skipped, and counted in self.rd_stats.
+	#
+	# Yields bytearrays of whole 5 byte records as they arrive, n
+	# records, or until the generator is closed if n is None.
+	#
+	def stream(self, n=None, depth=64):
+		eot = (self.setting["eot_enable"], self.setting["eot_char"])
+		self.attr("eot_enable", 1)
+		self.attr("eot_char", 10)
+		g = self.rd_records(n, 5, depth)
+		try:
+			self.wr("TB1")
+			for x in g:
+				yield x
+		finally:
+			g.close()
+			self.attr("eot_enable", eot[0])
+			self.attr("eot_char", eot[1])
+			self.wr("TB0")
+		if self.rd_stats["garbled"] or self.rd_stats["lost"]:
+			self.debug("Stream lost records: " + str(self.rd_stats))
+
+	###############################################################
+	# Capture n records into out (or a new buffer of n*5 bytes).
+	# Returns (buffer, number of records received)
+	#
+	def capture(self, n, out=None, depth=64):
+		if out == None:
+			out = bytearray(5 * n)
+		assert len(out) >= 5 * n
+		m = memoryview(out)
+		i = 0
+		for x in self.stream(n, depth):
+			m[i:i + len(x)] = x
+			i += len(x)
+		return out, i // 5
+
 	###############################################################
 	# Read n samples in fast binary mode.
 	# Return list of floating point values (or None if range error)
+	# Lost samples are left out, see self.rd_stats.
 	#
 	def read_fast(self, n):
-		l = list()
-		try:
-			d.wr("TB1")
-			for i in range(0,n):
-				l.append(self.rd_bin(5))
-		except:
-			pass
-		d.wr("TB0")
+		x, m = self.capture(n)
 		r = list()
-		for i in l:
-			r.append(self.bintofloat(i))
+		for i in range(0, m):
+			r.append(self.bintofloat(x[i * 5:i * 5 + 5]))
 		return r
 
 	###############################################################
@@ -22,12 +22,22 @@ class hp5372a(prologix_usb.gpib_dev):
 		print(self.id + " Taking a screendump into " + fname)
 		self.wr("INTERFACE;PSOURCE,DISPLAY")
 		self.wr("PRINT")
-		x = ""
-		while True:
-			x = x + self.rd()
-			if x[-5:] == "\033*rB\0":
-				break;
-		pcl_util.pcl_to_pbm(x, fname)
+		p = pcl_util.pcl_decoder()
+		# The dump ends with "ESC*rB" and a NUL, or a form feed,
+		# and the decoder gives up on anything it does not know.
+		def put(x):
+			if p.feed(x):
+				return True
+			return p.raster_end and x[-1:] == b"\0"
+		ok = self.rd_chunks(put, 5)
+		if p.error != None:
+			self.fail("HP5372A screen dump: " + p.error)
+		if not ok:
+			self.fail("HP5372A screen dump timed out")
+		if fname[-4:] == ".png":
+			p.png(fname)
+		else:
+			p.pbm(fname)
 
 if __name__ == "__main__":
 	d=hp5372a()
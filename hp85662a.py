@@ -115,23 +115,46 @@ c666d63e163e56c6 8b0d2e3b4e6d6bd7 866606991b9a5ada 2000000000000000
 """.replace("\n", "")))
 
 #######################################################################
-# Function to render a given character from the charrom above.
+# The characters, compiled on first use into lists of (x, y, draw)
+# strokes, relative to the lower left corner of the character cell.
 #
-def render_char(x0, y0, char, vfunc):
+glyphs = [None] * 256
+
+def glyph(char):
+	g = glyphs[char]
+	if g != None:
+		return g
+	g = []
 	p = char * 8
 	while True:
 		assert p < len(charrom)
 		v = charrom[p]
 		if v == 0:
-			return
+			break
 		if p & 7 == 7:
 			p = v * 8
 			continue
-		y = y0 + 2 * (v & 0xf)
-		x = x0 + 2 * ((v >> 4) & 0x7)
-		l = v >> 7
-		vfunc(x, y, l == 0)
+		g.append((2 * ((v >> 4) & 0x7), 2 * (v & 0xf), (v >> 7) == 0))
 		p += 1
+	glyphs[char] = g
+	return g
+
+#######################################################################
+# Function to render a given character from the charrom above.
+#
+def render_char(x0, y0, char, vfunc):
+	for x, y, draw in glyph(char):
+		vfunc(x0 + x, y0 + y, draw)
+
+###########################################################################
+# A piece of display program, see render.update()
+
+class block(object):
+	def __init__(self, id, entry):
+		self.id = id
+		self.entry = entry
+		self.reads = set()
+		self.ops = []
 
 ###########################################################################
 
@@ -152,19 +175,52 @@ class render():
 			"color-background": "white",
 			"penwidth": 3,
 		}
+		self.cache_key = None
+		self.cache_ops = None
+		self.blocks = None
+		self.next_id = 0
+		self.symbols = False
+
+	###############################################################
+	# Interpreting the display program produces a flat list of
+	# operations, in raw display coordinates:
+	#
+	#	(op_vec, x, y, draw)
+	#	(op_pen, "color-...", None, None)
+	#	(op_geo, "ratio-..." or None, d1-offset, None)
+	#	(op_chr, char, None, None)
+	#	(op_glyph, char, x, y)
+	#
+	# which replay() turns into plotter calls with the current geom.
+	#
+	# If self.symbols is set, and the plotter has a glyph() method,
+	# characters are drawn with that, otherwise stroke by stroke.
+	#
+
+	op_vec = 0
+	op_pen = 1
+	op_geo = 2
+	op_chr = 3
+	op_glyph = 4
+
+	def trace(self, s, *args):
+		if self.dbg_file != None:
+			self.xpl.append(s % args)
+
+	def op(self, *args):
+		if not self.dummy_pass:
+			self.ops.append(args)
 
 	def v(self,x,y, draw):
 		x &= 0x3ff
 		y &= 0x3ff
 		if not self.dummy_pass:
-			self.plt.vector(
-			     self.geom["margin"] +
-			     self.geom["aspect"] * (self.rt * x + self.x0),
-			     self.geom["margin"] +
-			     self.ym - (self.rt * y + self.y0),
-			     draw)
+			self.ops.append((self.op_vec, x, y, draw))
 		self.x = x
 		self.y = y
+		self.px = x
+		self.py = y
+		self.pgeo = (self.rt, self.offs)
 
 	def graph(self, d):
 		if d <= 1023:
@@ -178,49 +234,65 @@ class render():
 				self.v(self.x + 1, 0, False)
 		else:
 			self.v(self.x + 1, 0, False)
-		return "grp %d" % d
+		self.trace("grp %d", d)
 
 	def label(self, d):
 		d &= 0xff
-		if not self.dummy_pass:
-			self.plt.comment("char 0x%02x" % d)
+		self.op(self.op_chr, d, None, None)
 		if d == 0:
-			return "lbl NUL"
+			self.trace("lbl NUL")
+			return
 		if d == 8:
 			self.v(self.x - 16, self.y, False);
-			return "lbl bs"
+			self.trace("lbl bs")
+			return
 		if d == 10:
 			self.v(self.x, self.y - 32, False);
-			return "lbl nl"
+			self.trace("lbl nl")
+			return
 		if d == 13:
 			self.v(0, self.y, False);
-			return "lbl cr"
+			self.trace("lbl cr")
+			return
 		if d == 17:
-			return "lbl -blink"
+			self.trace("lbl -blink")
+			return
 		if d == 18:
-			return "lbl +blink"
+			self.trace("lbl +blink")
+			return
 		if d == 32:
 			self.v(self.x + 16, self.y, False);
-			return "lbl sp"
+			self.trace("lbl sp")
+			return
 		if d == 145:
 			self.nxtadr = (self.adr + 16) & 0xff0
-			return "lbl sk16"
+			self.trace("lbl sk16")
+			return
 		if d == 146:
 			self.nxtadr = (self.adr + 32) & 0xfe0
-			return "lbl sk32"
+			self.trace("lbl sk32")
+			return
 		if d == 147:
 			self.nxtadr = (self.adr + 64) & 0xfc0
-			return "lbl sk64"
+			self.trace("lbl sk64")
+			return
 		self.y &= 0x3e0
 		self.x &= 0x3f0
-		render_char(self.x & ~0x0f, self.y & ~0x1f, d, self.v)
+		g = glyph(d)
+		if len(g):
+			self.op(self.op_glyph, d, self.x, self.y)
+			self.x = (self.x + g[-1][0]) & 0x3ff
+			self.y = (self.y + g[-1][1]) & 0x3ff
+			self.px = self.x
+			self.py = self.y
+			self.pgeo = (self.rt, self.offs)
 		self.y &= 0x3e0
 		self.x &= 0x3f0
 		self.x += 16
 		if d > 32 and d <= 126:
-			return "lbl '%c'" % d
+			self.trace("lbl '%c'", d)
 		else:
-			return "lbl 0x%03x" % d
+			self.trace("lbl 0x%03x", d)
 
 	def vector(self, d):
 		x = d
@@ -234,26 +306,22 @@ class render():
 			x = (self.x + x) & 0x3ff
 			y = (self.y + y) & 0x3ff
 		self.v(x, y, p == 0)
-		xx = "vec %d,%d" % (x, y)
-		if p == 0:
-			xx += " up"
-		if r != 0:
-			xx += " rel"
-		return xx
+		self.trace("vec %d,%d%s%s", x, y,
+		    " up" if p == 0 else "", " rel" if r != 0 else "")
 
 	def progctl(self, d):
 		d &= ~0x403
-		x = "prg"
+		self.trace("prg")
 		if (d & 0x0c8) == 0x000:
 			# skip to next control
 			self.nxtadr = self.adr + 1
-			x += " skc"
+			self.trace(" skc")
 
 		elif (d & 0x0c8) == 0x008:
 			# jmp
 			d &= ~0x008
 			self.nxtadr = self.ram[self.adr + 1]
-			x += " jmp(%03x)" % self.nxtadr 
+			self.trace(" jmp(%03x)", self.nxtadr)
 
 		elif (d & 0x0c8) == 0x048:
 			# dsz
@@ -261,89 +329,81 @@ class render():
 			self.counter -= 1
 			if self.counter == 0:
 				self.nxtadr = self.adr + 2
-			x += " dsz(%d)" % self.counter
+			self.trace(" dsz(%d)", self.counter)
 
 		elif (d & 0x0c8) == 0x088:
 			# jsr
 			d &= ~0x088
 			s = self.ram[self.adr + 1]
-			x += " jsr(%03x)" % s
+			self.trace(" jsr(%03x)", s)
 			self.retadr = self.adr + 2
 			self.nxtadr = s
 		elif (d & 0x0c8) == 0x0c8:
 			# rtn
 			d &= ~0x0c8
 			self.nxtadr = self.retadr
-			x += " rtn(%03x)" % self.nxtadr
+			self.trace(" rtn(%03x)", self.nxtadr)
 			
 		if d != 0:
-			x += " ??? %03x" % d
+			self.trace(" ??? %03x", d)
+			self.bad = True
 		self.skipctl = True
-		return x
 
 	def dispctl(self, d):
 		d &= ~0x400
-		x = "dsp"
+		self.trace("dsp")
 		if d & 3 == 0:
 			self.state = self.graph
-			x += " grp"
+			self.trace(" grp")
 		elif d & 3 == 1:
 			self.state = self.label
-			x += " lbl"
+			self.trace(" lbl")
 		elif d & 3 == 2:
 			self.state = self.vector
-			x += " vec"
+			self.trace(" vec")
 		d &= ~0x003
 
 		if d & 0x04:
 			d &= ~0x004
 			self.stop = True
-			x += " end"
+			self.trace(" end")
 
 		if d & 0x080 == 0x080:
 			d &= ~0x088
-			if not self.dummy_pass:
-				self.plt.pencolor(self.geom["color-bright"])
-			x += " bright"
+			self.pen = "color-bright"
+			self.trace(" bright")
 		elif d & 0x008 == 0x008:
 			d &= ~0x088
-			if not self.dummy_pass:
-				self.plt.pencolor(self.geom["color-dim"])
-			x += " dim"
+			self.pen = "color-dim"
+			self.trace(" dim")
 		else:
-			if not self.dummy_pass:
-				self.plt.pencolor(self.geom["color-normal"])
+			self.pen = "color-normal"
+		self.op(self.op_pen, self.pen, None, None)
 			
 		if d & 0x10:
 			d &= ~0x010
 			self.v(0, self.y, False)
-			x += " clrx"
+			self.trace(" clrx")
 			
 		if d & 0x20:
 			d &= ~0x020
 			self.nxtadr = self.adr + 0x400
 			self.nxtadr &= 0xc00
-			x += " skp"
-
-		if (d & 0x140) == 0x000:
-			self.rt = 1.0
-		elif (d & 0x140) == 0x040:
-			self.rt = self.geom["ratio-d2"]
-		elif (d & 0x140) == 0x100:
-			self.rt = self.geom["ratio-bex"]
-		elif (d & 0x140) == 0x140:
-			self.rt = self.geom["ratio-d3"]
-		if d & 0x40:
-			self.x0 = 0
-			self.y0 = 0
-		else:
-			self.x0 = self.geom["d1-x-offset"]
-			self.y0 = self.geom["d1-y-offset"]
+			self.trace(" skp")
+
+		self.rt = {
+			0x000: None,
+			0x040: "ratio-d2",
+			0x100: "ratio-bex",
+			0x140: "ratio-d3",
+		}[d & 0x140]
+		self.offs = (d & 0x40) == 0
+		self.op(self.op_geo, self.rt, self.offs, None)
 		d &= ~0x140
 			
 		if d != 0:
-			x += " ??? %03x" % d
-		return x
+			self.trace(" ??? %03x", d)
+			self.bad = True
 
 	def count(self, d):
 		self.counter = d & 0xff
@@ -351,78 +411,293 @@ class render():
 			self.thr = 0;
 		else:
 			self.thr = self.counter * 4
-		return "cnt (%d) thr (%d)" % (self.counter, self.thr)
+		self.trace("cnt (%d) thr (%d)", self.counter, self.thr)
 
-	def render(self, ram, plt):
-		self.plt = plt;
-		self.ram = ram
-
-		self.ym = 1023. * self.geom["ratio-d2"]
-		margin = 2 * self.geom["margin"]
-
-		self.plt.bbox(
-			0,
-			0,
-			margin + self.geom["aspect"] * self.ym,
-			margin + self.ym,
-		)
-		self.plt.background(self.geom["color-background"])
-
-
-		self.plt.start()
+	###############################################################
+	# Interpret one word of the display program
 
-		self.plt.penwidth(self.geom["penwidth"])
+	def step(self):
+		d = self.ram[self.adr]
+		self.nxtadr = self.adr + 1
+		self.xpl = []
 
+		if (d & 0xc00) != 0x400:
+			if self.skipctl:
+				self.trace("skipctl")
+			else:
+				self.state(d)
+		else:
+			self.skipctl = False
+			if (d & 0x203) == 0x003:
+				self.progctl(d)
+			elif (d & 0x200) == 0x000:
+				self.dispctl(d)
+			else:
+				self.count(d)
+
+		self.adr = self.nxtadr & 0xfff
+
+		if len(self.xpl) and self.dbg_file != None:
+			self.dbg_file.write(
+			    ("0x%03x 0x%03x [%03x, %03x]" +
+			    " >%03x %s\n") %
+			    (self.adr, d, self.x, self.y,
+			    self.nxtadr, "".join(self.xpl)))
+
+	def start_pass(self):
+		self.dispctl(0x400)
+		self.v(0,0, False)
+		self.adr = 0
+		self.stop = False
+		self.skipctl = False
+		self.bad = False
+
+	def start(self, ram):
+		self.ram = ram
+		self.ops = []
 		self.retadr = 0
 		self.counter = 0
 		self.thr = 0
-		self.x0 = 0
-		self.y0 = 0
+		self.xpl = []
 
-		self.dummy_pass = False
+	###############################################################
+	# Run the display program in ram[] and return the list of
+	# operations.  The result for the last ram seen is cached.
+
+	def compile(self, ram):
+		key = tuple(ram)
+		if key == self.cache_key:
+			return self.cache_ops
+		self.start(ram)
 
 		# The counter/threshold register is loaded late in the
 		# default program, so we have run though it twice in order
 		# to have the expected value at the start of the second pass
 
 		for self.dummy_pass in (True, False):
-			self.dispctl(0x400)
-			self.v(0,0, False)
-			self.adr = 0
-			self.stop = False
-			self.skipctl = False
+			self.start_pass()
+			while not self.bad and not self.stop:
+				self.step()
+
+		self.cache_key = key
+		self.cache_ops = self.ops
+		return self.ops
+
+	###############################################################
+	# Incremental rendering, for mirroring the display.
+	#
+	# Both passes are cut into blocks at each control word.  Each
+	# block has the interpreter state at its entry, the addresses it
+	# read, and its operations, which start by setting the pen, the
+	# position (with the geometry in force when the beam got there)
+	# and the geometry, so a block can be drawn on its own.
+	#
+	# update() compares a new ram image with the previous one, and
+	# interprets again from the first block which read a changed
+	# word, or from the start if the state at the start of the pass
+	# changed.  Once the state matches the entry of an old block
+	# after the last one affected, the old blocks from there on are
+	# kept, as they would come out the same.
+	#
+	# Returns ([ids of dropped blocks], [(id, ops) of new blocks]),
+	# for the second pass.  The ops can be drawn with replay_ops().
+	#
+	# The ram image the blocks were made from is kept in self.upd_ram,
+	# apart from self.ram, so compile() can be used in between.
+	#
+
+	def snapshot(self):
+		return (self.adr, self.x, self.y, self.px, self.py,
+		    self.pgeo, self.state, self.counter, self.thr,
+		    self.retadr, self.skipctl, self.pen, self.rt, self.offs)
+
+	def restore(self, st):
+		(self.adr, self.x, self.y, self.px, self.py,
+		    self.pgeo, self.state, self.counter, self.thr,
+		    self.retadr, self.skipctl, self.pen, self.rt, self.offs) = st
+		self.stop = False
+		self.bad = False
+
+	# Run blocks until the end of the pass, or until the state
+	# matches a key in join.  Returns (blocks, join value or None)
+	def run_blocks(self, join = None):
+		l = []
+		while True:
+			b = block(self.next_id, self.snapshot())
+			self.next_id += 1
+			self.ops = b.ops
+			if not self.dummy_pass:
+				self.ops.append((self.op_pen, self.pen, None, None))
+				self.ops.append((self.op_geo, self.pgeo[0],
+				    self.pgeo[1], None))
+				self.ops.append((self.op_vec, self.px, self.py,
+				    False))
+				self.ops.append((self.op_geo, self.rt, self.offs,
+				    None))
 			while True:
-				d = self.ram[self.adr]
-				self.nxtadr = self.adr + 1
-
-				if (d & 0xc00) != 0x400:
-					if self.skipctl:
-						xpl = "skipctl"
-					else:
-						xpl = self.state(d)
-				else:
-					self.skipctl = False
-					if (d & 0x203) == 0x003:
-						xpl = self.progctl(d)
-					elif (d & 0x200) == 0x000:
-						xpl = self.dispctl(d)
-					else:
-						xpl = self.count(d)
-
-				self.adr = self.nxtadr & 0xfff
-
-				if xpl != "" and self.dbg_file != None:
-					self.dbg_file.write(
-					    ("0x%03x 0x%03x [%03x, %03x]" +
-					    " >%03x %s\n") %
-					    (self.adr, d, self.x, self.y,
-					    self.nxtadr, xpl))
-				if xpl.find("??") != -1:
+				b.reads.add(self.adr)
+				b.reads.add((self.adr + 1) & 0xfff)
+				self.step()
+				b.reads.add(self.adr)
+				if self.bad or self.stop:
+					break
+				if (self.ram[self.adr] & 0xc00) == 0x400:
 					break
-				if self.stop:
-					break;
-				
-		self.plt.stop()
+			l.append(b)
+			if self.bad or self.stop:
+				return l, None
+			if join != None:
+				j = join.get(self.snapshot())
+				if j != None:
+					return l, j
+
+	# Redo the blocks of one pass, starting in state "entry"
+	def splice(self, old, diff, entry):
+		hit = [i for i, b in enumerate(old) if b.reads & diff]
+		if entry != old[0].entry:
+			hit.insert(0, 0)
+		if not hit:
+			return old, [], [], None
+		k = hit[0]
+		join = dict()
+		for j in range(len(old) - 1, hit[-1], -1):
+			join[old[j].entry] = j
+		if k == 0:
+			self.restore(entry)
+		else:
+			self.restore(old[k].entry)
+		l, j = self.run_blocks(join)
+		end = None
+		if j == None:
+			j = len(old)
+			end = self.snapshot()
+		return old[:k] + l + old[j:], old[k:j], l, end
+
+	# The state at the start of the second pass
+	def entry2(self):
+		self.restore(self.end1)
+		self.ops = []
+		self.dummy_pass = False
+		self.start_pass()
+		return self.snapshot()
+
+	def update(self, ram):
+		ram = list(ram)
+		if self.blocks == None:
+			return self.update_all(ram)
+		diff = set()
+		for i, v in enumerate(ram):
+			if v != self.upd_ram[i]:
+				diff.add(i)
+		if not diff:
+			return [], []
+		self.ram = ram
+		self.upd_ram = ram
+		self.dummy_pass = True
+		self.blocks1, d, a, end = self.splice(self.blocks1, diff,
+		    self.blocks1[0].entry)
+		if end != None:
+			self.end1 = end
+		self.blocks, d, a, end = self.splice(self.blocks, diff,
+		    self.entry2())
+		return [b.id for b in d], [(b.id, b.ops) for b in a]
+
+	def update_all(self, ram):
+		self.start(ram)
+		self.upd_ram = ram
+		self.dummy_pass = True
+		self.start_pass()
+		self.blocks1 = self.run_blocks()[0]
+		self.end1 = self.snapshot()
+		self.entry2()
+		self.blocks = self.run_blocks()[0]
+		return [], [(b.id, b.ops) for b in self.blocks]
+
+	###############################################################
+	# Play a list of operations from compile() onto a plotter
+
+	def replay(self, ops, plt):
+		g = self.geom
+		ym = 1023. * g["ratio-d2"]
+		margin = g["margin"]
+		aspect = g["aspect"]
+
+		plt.bbox(
+			0,
+			0,
+			2 * margin + aspect * ym,
+			2 * margin + ym,
+		)
+		plt.background(g["color-background"])
+
+		plt.start()
+
+		plt.penwidth(g["penwidth"])
+
+		self.replay_ops(ops, plt)
+
+		plt.stop()
+
+	###############################################################
+	# Play operations onto a plotter which has been started
+
+	def replay_ops(self, ops, plt):
+		g = self.geom
+		ym = 1023. * g["ratio-d2"]
+		margin = g["margin"]
+		aspect = g["aspect"]
+		sym = self.symbols and hasattr(plt, "glyph")
+		rt = 1.0
+		x0 = 0
+		y0 = 0
+		for op, a, b, c in ops:
+			if op == self.op_vec:
+				plt.vector(
+				    margin + aspect * (rt * a + x0),
+				    margin + ym - (rt * b + y0),
+				    c)
+			elif op == self.op_glyph:
+				gl = glyph(a)
+				# Glyphs which start by drawing from wherever
+				# the beam was, or which wrap, are not reusable
+				if (sym and not gl[0][2] and
+				    b + 14 <= 0x3ff and c + 30 <= 0x3ff):
+					plt.glyph("c%02x" % a, gl,
+					    margin + aspect * (rt * b + x0),
+					    margin + ym - (rt * c + y0),
+					    aspect * rt, -rt)
+					b += gl[-1][0]
+					c += gl[-1][1]
+					plt.vector(
+					    margin + aspect * (rt * b + x0),
+					    margin + ym - (rt * c + y0),
+					    False)
+					continue
+				for x, y, draw in gl:
+					plt.vector(
+					    margin + aspect *
+					    (rt * ((b + x) & 0x3ff) + x0),
+					    margin + ym -
+					    (rt * ((c + y) & 0x3ff) + y0),
+					    draw)
+			elif op == self.op_pen:
+				plt.pencolor(g[a])
+			elif op == self.op_geo:
+				if a == None:
+					rt = 1.0
+				else:
+					rt = g[a]
+				if b:
+					x0 = g["d1-x-offset"]
+					y0 = g["d1-y-offset"]
+				else:
+					x0 = 0
+					y0 = 0
+			elif op == self.op_chr:
+				plt.comment("char 0x%02x" % a)
+
+	def render(self, ram, plt):
+		self.replay(self.compile(ram), plt)
 
 
 if __name__ == "__main__":
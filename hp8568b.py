@@ -2,7 +2,10 @@
 
 import sys
 import time
+import array
+import pylt
 import prologix_usb
+import hpgl_util
 import subprocess
 
 class hp8568b(prologix_usb.gpib_dev):
@@ -13,6 +16,7 @@ class hp8568b(prologix_usb.gpib_dev):
 		if x != "HP8568B":
 			self.fail("HP8568B ID failure (" + x + ")")
 		self.id = x
+		self.scr_buf = bytearray(10010)
 		self.errors()
 
 	##############
@@ -36,6 +40,12 @@ class hp8568b(prologix_usb.gpib_dev):
 		print(self.id + " Taking a " + format +
 		    " screendump into " + fname)
 		x=self.ask("PLOT 0,0,40000,40000")
+		if format == "svg":
+			hpgl_util.svg(x, fname, "42145670", "11111111")
+			return
+		if format in ("png", "pbm"):
+			hpgl_util.raster(x, fname, "42145670", "11111111")
+			return
 		p = subprocess.Popen([
 			"hp2xx",
 			"-m", format,
@@ -59,20 +69,52 @@ class hp8568b(prologix_usb.gpib_dev):
 	# Read screen memory as array of 4096 unsigned shorts
 	# See Appendix A in the manual for layout and meaning of this
 	#
-	def screen_memory(self):
-		import array 
-		x=bytearray()
-		for i in range(0,5):
-			self.wr("O2;DA%d;KS{" % (i * 1001))
-			x.extend(self.rd_bin(2002))
-		if len(x) != 10010:
-			print("WRONG LEN %d" % len(x))
-		assert len(x) == 10010
-		y = array.array("H")
-		for i in range(0,4096):
-			y.append(x[i * 2] * 256 + x[i * 2 + 1])
+	# KS{ gives at most 1001 words at a time, so it takes five
+	# reads, but they are done as one adapter transaction, into
+	# the same buffer every time.
+	# Pass a previous result as "y" to have it refilled in place.
+	#
+	def screen_memory(self, y=None):
+		n = self.submit(self.screen_xfer, self.scr_buf).result()
+		if n != 10010:
+			print("WRONG LEN %d" % n)
+		assert n == 10010
+		if y == None or len(y) != 4096:
+			y = array.array("H", [0]) * 4096
+		pylt.arr_fill(y, memoryview(self.scr_buf)[:8192])
+		if sys.byteorder == "little":
+			y.byteswap()
 		return y
 
+	def screen_xfer(self, x):
+		idle = self.setting["rd_idle_ms"]
+		if idle != None:
+			idle *= 1e-3
+		m = memoryview(x)
+		n = 0
+		for i in range(0,5):
+			self.pusb.wr("O2;DA%d;KS{" % (i * 1001))
+			self.pusb.cmd("++read eoi")
+			n += self.pusb.rd_into(m[i * 2002:(i + 1) * 2002], idle)
+		return n
+
+	###############################################################
+	# Generator for mirroring the display: yields the screen memory
+	# n times (forever if None), at most every "interval" seconds.
+	# The same array is refilled for each frame.
+	#
+	def screen_frames(self, n=None, interval=0.):
+		y = None
+		i = 0
+		while n == None or i < n:
+			t = time.time()
+			y = self.screen_memory(y)
+			yield y
+			i += 1
+			dt = interval - (time.time() - t)
+			if dt > 0:
+				time.sleep(dt)
+
 if __name__ == "__main__":
 	d=hp8568b()
 	print("Device responds: " + d.ask("ID") + " Rev: " + d.ask("REV"))
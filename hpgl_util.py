@@ -0,0 +1,192 @@
+#/usr/local/bin/python
+#
+# A small in-process HP-GL interpreter, enough for the plots which
+# instruments like the hp3577a and hp8568b send, so we do not have to
+# fork hp2xx for every screen dump.
+#
+# The plot is parsed once into a display list of pen changes, moves
+# and draws, which can then be replayed onto any pen-plotter class
+# with the svg_plotter interface.
+#
+# Understood: PA PR PU PD SP LB DT SI.  Everything else is ignored.
+#
+# Usage:
+#	h = hpgl_util.hpgl(d.ask("PLOT 0,0,40000,40000"))
+#	h.plot(svg_plotter.plotter("_.svg"), "42145670", "11111111")
+#
+# Pen colours and widths are given as strings of digits, one per pen,
+# like the -c and -p arguments to hp2xx.
+#
+
+import re
+
+import hp85662a
+import svg_plotter
+
+# hp2xx colour codes
+colors = ("white", "black", "red", "green", "blue", "cyan", "magenta",
+    "yellow")
+
+# Plotter units per cm
+pu_cm = 400.
+
+numbers = re.compile(r"[-+]?[0-9]*\.?[0-9]+")
+
+class hpgl(object):
+
+	def __init__(self, s):
+		self.dl = []
+		self.x0 = None
+		self.y0 = None
+		self.x1 = None
+		self.y1 = None
+		self.parse(s)
+
+	def bbox(self, x, y):
+		if self.x0 == None:
+			self.x0 = self.x1 = x
+			self.y0 = self.y1 = y
+			return
+		self.x0 = min(self.x0, x)
+		self.x1 = max(self.x1, x)
+		self.y0 = min(self.y0, y)
+		self.y1 = max(self.y1, y)
+
+	def move(self, x, y, draw):
+		if draw:
+			if self.pen != 0:
+				self.bbox(self.x, self.y)
+				self.bbox(x, y)
+			self.dl.append((1, x, y))
+		else:
+			self.dl.append((0, x, y))
+		self.x = x
+		self.y = y
+
+	###############################################################
+	# Labels are drawn with the hp85662a character ROM, which has
+	# a 16 by 32 character cell.  Character spacing is 1.5 times
+	# the width and line spacing twice the height, as in HP-GL.
+
+	def label(self, t):
+		sx = 1.5 * self.cw / 16.
+		sy = 2.0 * self.ch / 32.
+		lx = self.x
+		for c in t:
+			c = ord(c)
+			if c == 13:
+				self.move(lx, self.y, False)
+				continue
+			if c == 10:
+				self.move(self.x, self.y - 2 * self.ch, False)
+				continue
+			if c > 255:
+				c = 0x3f
+			x = self.x
+			y = self.y
+			hp85662a.render_char(0, 0, c, lambda cx, cy, draw:
+			    self.move(x + cx * sx, y + cy * sy, draw))
+			self.move(x + 1.5 * self.cw, y, False)
+
+	def parse(self, s):
+		self.x = 0.
+		self.y = 0.
+		self.pen = 1
+		self.down = False
+		self.rel = False
+		self.term = "\x03"
+		self.cw = 0.19 * pu_cm
+		self.ch = 0.27 * pu_cm
+		i = 0
+		while i < len(s) - 1:
+			c = s[i:i + 2].upper()
+			if not c.isalpha():
+				i += 1
+				continue
+			i += 2
+			if c == "LB":
+				j = s.find(self.term, i)
+				if j == -1:
+					j = len(s)
+				self.label(s[i:j])
+				i = j + 1
+				continue
+			if c == "DT":
+				if i < len(s):
+					self.term = s[i]
+				i += 1
+				continue
+			j = i
+			while j < len(s) and not s[j].isalpha() and s[j] != ';':
+				j += 1
+			a = [float(v) for v in numbers.findall(s[i:j])]
+			i = j
+			if c == "SP":
+				self.pen = int(a[0]) if len(a) else 0
+				self.dl.append((2, self.pen, None))
+				continue
+			if c == "SI":
+				if len(a) >= 2:
+					self.cw = a[0] * pu_cm
+					self.ch = a[1] * pu_cm
+				else:
+					self.cw = 0.19 * pu_cm
+					self.ch = 0.27 * pu_cm
+				continue
+			if c == "PU":
+				self.down = False
+			elif c == "PD":
+				self.down = True
+			elif c == "PA":
+				self.rel = False
+			elif c == "PR":
+				self.rel = True
+			else:
+				continue
+			for k in range(0, len(a) - 1, 2):
+				if self.rel:
+					self.move(self.x + a[k], self.y + a[k + 1],
+					    self.down)
+				else:
+					self.move(a[k], a[k + 1], self.down)
+
+	###############################################################
+	# Replay the display list onto a plotter, with the y-axis
+	# flipped, pen widths in 1/10 mm and "margin" in plotter units.
+
+	def plot(self, plt, pencolors = "12345670", penwidths = "11111111",
+	    margin = 200, background = "white"):
+		if self.x0 == None:
+			self.x0 = self.x1 = self.y0 = self.y1 = 0.
+		xo = margin - self.x0
+		yo = margin + self.y1
+		plt.bbox(0, 0, self.x1 - self.x0 + 2 * margin,
+		    self.y1 - self.y0 + 2 * margin)
+		plt.background(background)
+		plt.start()
+		pen = 1
+		for op, x, y in self.dl:
+			if op == 2:
+				pen = x
+				if pen < 1:
+					continue
+				i = (pen - 1) % len(pencolors)
+				plt.pencolor(colors[int(pencolors[i]) & 7])
+				i = (pen - 1) % len(penwidths)
+				plt.penwidth(int(penwidths[i]) * pu_cm / 100.)
+				continue
+			plt.vector(xo + x, yo - y, op == 1 and pen > 0)
+		plt.stop()
+
+###############################################################
+# Render HP-GL string s into an SVG file
+
+def svg(s, fname, pencolors = "12345670", penwidths = "11111111"):
+	hpgl(s).plot(svg_plotter.plotter(fname), pencolors, penwidths)
+
+###############################################################
+# Render HP-GL string s into a PNG or PBM file (needs numpy)
+
+def raster(s, fname, pencolors = "12345670", penwidths = "11111111"):
+	import raster_plotter
+	hpgl(s).plot(raster_plotter.plotter(fname), pencolors, penwidths)
@@ -0,0 +1,63 @@
+#/usr/local/bin/python
+
+import array
+import os
+import sys
+
+import pylt
+
+#######################################################################
+# Helper function for hp3458a and hp3245a classes
+#
+# Bulk read of memory using the undocumented MREAD command.
+#
+# MREAD only answers one ASCII word at a time.  The queries are handed
+# to the transport "depth" at a time with ask_many(), which on a
+# Prologix adapter saves the serial round trip per word.  Each query
+# is still answered, over GPIB, before the next one goes out.
+#
+# Every "chunk" words progress(adr, lo, hi) is called, and if fname
+# is given, the words are appended to that file, big-endian, as they
+# sit in memory.  If the file already holds the start of the range,
+# from an interrupted run, we continue from where it stopped.
+#
+# Returns array('H')
+#
+
+def mread(dev, lo, hi, fname=None, progress=None, chunk=1024, depth=32):
+	# Addresses must be even
+	assert lo & 1 == 0
+	assert hi & 1 == 0
+	a = array.array('H')
+	fo = None
+	if fname != None:
+		if os.path.exists(fname):
+			fo = open(fname, "r+b")
+			b = fo.read(hi - lo)
+			b = b[:len(b) & ~1]
+			pylt.arr_frombytes(a, b)
+			if sys.byteorder == "little":
+				a.byteswap()
+			fo.seek(len(b))
+			fo.truncate()
+		else:
+			fo = open(fname, "wb")
+	adr = lo + 2 * len(a)
+	while adr < hi:
+		n = min(chunk, (hi - adr) // 2)
+		l = dev.ask_many(
+		    ["MREAD %d" % i for i in range(adr, adr + 2 * n, 2)],
+		    depth=depth)
+		w = array.array('H', [int(j) & 0xffff for j in l])
+		a.extend(w)
+		if fo != None:
+			if sys.byteorder == "little":
+				w.byteswap()
+			fo.write(pylt.arr_tobytes(w))
+			fo.flush()
+		adr += 2 * n
+		if progress != None:
+			progress(adr, lo, hi)
+	if fo != None:
+		fo.close()
+	return a
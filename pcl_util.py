@@ -1,93 +1,130 @@
 #/usr/local/bin/python
 
-import array
+import re
+
+import png_util
 
 #######################################################################
-# Helper function for hp5372a class
+# Helper functions for hp5372a and tds540a classes
+#
+# Decode the HP-PCL raster graphics they send as hardcopy, into a PBM
+# or PNG file.
+#
+# pcl_decoder takes the data in chunks, as they arrive, so the work
+# is done while the transfer runs:
 #
-# Convert a HP-PCL string from a HP5372A to a PBM file
+#	p = pcl_util.pcl_decoder()
+#	for x in chunks:
+#		if p.feed(x):
+#			break
+#	p.pbm("_.pbm")
+#
+
+pcl_hdr = re.compile(b"\x1b\\*([a-z])([0-9]*)([A-Z])")
+pcl_part = re.compile(b"\x1b(\\*([a-z][0-9]*)?)?\\Z")
+
+class pcl_decoder(object):
+
+	def __init__(self):
+		self.buf = bytearray()
+		self.rows = []
+		self.w = 0
+		self.raster_end = False
+		self.done = False
+		# Why we stopped, if it was not the end of the page
+		self.error = None
+
+	###############################################################
+	# Add a chunk of data, returns True when the end of the page
+	# (form feed) has been seen, or something we do not understand,
+	# in which case self.error says what.
+
+	def feed(self, data):
+		if self.done:
+			return True
+		if not isinstance(data, (bytes, bytearray)):
+			data = data.encode("latin-1")
+		b = self.buf
+		b += data
+		i = 0
+		l = len(b)
+		while i < l:
+			c = b[i]
+			if c == 0:
+				i += 1
+				continue
+			if c == 12:
+				self.done = True
+				break
+
+			# We deal with escape sequences, so insist we have one
+			if c != 27:
+				print(b[i:i+10])
+				self.error = "Not PCL: " + repr(bytes(b[i:i+10]))
+				self.done = True
+				break
+			if i + 1 < l and b[i + 1] == 27:
+				i += 1
+				continue
+
+			m = pcl_hdr.match(b, i)
+			if m == None:
+				if pcl_part.match(b, i) == None:
+					self.error = "Bad escape: " + \
+					    repr(bytes(b[i:i+10]))
+					self.done = True
+				break
+			c, n, t = m.groups()
+			n = int(n or b"0")
+			j = m.end()
+			if c == b"b" and t == b"W":
+				# 'ESC * b # W" = Transfer Raster Data
+				if j + n > l:
+					break
+				self.rows.append(bytes(b[j:j + n]))
+				if n > self.w:
+					self.w = n
+				j += n
+			elif c == b"r" and t == b"B":
+				# "ESC * r # B"  = End Raster Graphics
+				self.raster_end = True
+			elif (c, t) not in ((b"r", b"A"), (b"r", b"S"), (b"t", b"R")):
+				# Start Raster Graphics, Width, Set Resolution
+				self.error = "Unknown: ESC * %s %d %s" % (
+				    c.decode(), n, t.decode())
+				print(self.error)
+				self.done = True
+				break
+			i = j
+		del b[:i]
+		return self.done
+
+	###############################################################
+	# The bitmap, with a margin of 8 blank rows top and bottom and
+	# 8 pixels left and right.  Returns (width, height, rows)
+
+	def bitmap(self):
+		w = self.w + 2
+		z = b"\0" * w
+		l = [z] * 8
+		for r in self.rows:
+			l.append(b"\0" + r + z[:w - 1 - len(r)])
+		l += [z] * 8
+		return (w * 8, len(l), b"".join(l))
+
+	def pbm(self, fname):
+		png_util.pbm(fname, *self.bitmap())
+
+	def png(self, fname):
+		w, h, b = self.bitmap()
+		inv = bytes(bytearray([255 - i for i in range(256)]))
+		png_util.png(fname, w, h, b.translate(inv), 1, 0)
+
+#######################################################################
+# Convert a HP-PCL string to a PBM file
 #
 
 def pcl_to_pbm(data, ofile="_.hp5372a.pbm"):
-	a = array.array('B', data)
-	l = len(a)
-
-	# First pass, find out how tall and how wide this is
-	# and split into raster lines
-	h = list()
-	for i in range(0,8):
-		h.append(array.array('B', (0,0)))
-	w = 0
-	i = 0
-	while i < l:
-		if a[i] == 0:
-			#print("NUL")
-			i += 1
-			continue
-		if a[i] == 12:
-			break
-		
-
-		# We deal with escape sequences, so insist we have one
-		if a[i] != 27:
-			print(a[i:i+10])
-			break
-		if i + 1 < l and a[i + 1] == 27:
-			i += 1
-			continue
-
-		if a[i + 1] != 42:
-			break
-
-		assert a[i+1] == 42
-		c = a[i+2]
-		n = 0
-		i += 3
-		while a[i] >= 48 and a[i] <= 57:
-			n *= 10
-			n += a[i] - 48
-			i += 1
-		t = a[i]
-		i += 1
-		if c == 114 and t == 65:
-			# "ESC * r # A"  = Start Raster Graphics
-			pass;
-		elif c == 114 and t == 66:
-			# "ESC * r # B"  = End Raster Graphics
-			pass;
-		elif c == 114 and t == 83:
-			# "ESC * r # S"  = Width of Raster Graphics
-			pass;
-		elif c == 116 and t == 82:
-			# "ESC * t # R"  = Set Resolution
-			pass;
-		elif c == 98 and t == 87:
-			# 'ESC * b # W" = Transfer Raster Data
-			p = a[i: i + n]
-			assert len(p) == n
-			h.append(p)
-			i += n
-			if n > w:
-				w = n
-		else:
-			print("Unknown: ESC * %c(%d) %d %c(%d)" % (c, c, n, t, t))
-			break
-			
-	for i in range(0,8):
-		h.append(array.array('B', (0,0)))
-
-	fo = open(ofile, 'w')
-	fo.write("P4\n%d %d\n" % (16 + w * 8, len(h)))
-	for i in h:
-		fo.write("%c" % 0x00)
-		for j in i:
-			fo.write("%c" % j)
-		for k in range (len(i),w):
-			fo.write("%c" % 0x00)
-		fo.write("%c" % 0x00)
-	fo.close()
-
-#f = open("_x")
-#a=f.read()
-#f.close()
-#pcl_to_pbm(a, "_tds540.pbm")
+	p = pcl_decoder()
+	p.feed(data)
+	p.pbm(ofile)
@@ -0,0 +1,49 @@
+#/usr/local/bin/python
+
+import struct
+import zlib
+
+#######################################################################
+# Helper functions to write bitmaps as PNG or PBM files, with nothing
+# but the standard library.
+#
+# "rows" is the image as one bytes-like object, height rows of packed
+# pixels, as the PNG/PBM format wants them, no padding between rows.
+#
+# PNG colour types: 0 = gray, 2 = RGB.  With a depth of 1, a set bit
+# is white in PNG, but black in PBM.
+#
+
+def png_chunk(t, d):
+	c = zlib.crc32(t)
+	c = zlib.crc32(d, c) & 0xffffffff
+	return struct.pack(">I", len(d)) + t + d + struct.pack(">I", c)
+
+def png(fname, width, height, rows, depth = 8, ctype = 2):
+	bpp = {0: 1, 2: 3}[ctype]
+	rb = (width * bpp * depth + 7) // 8
+	rows = memoryview(rows)
+	assert len(rows) >= rb * height
+	# Filter type 0 (None) in front of each row
+	z = zlib.compressobj(6)
+	l = []
+	for i in range(0, rb * height, rb):
+		l.append(z.compress(b"\0"))
+		l.append(z.compress(rows[i:i + rb].tobytes()))
+	l.append(z.flush())
+	fo = open(fname, "wb")
+	fo.write(b"\x89PNG\r\n\x1a\n")
+	fo.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB",
+	    width, height, depth, ctype, 0, 0, 0)))
+	fo.write(png_chunk(b"IDAT", b"".join(l)))
+	fo.write(png_chunk(b"IEND", b""))
+	fo.close()
+
+def pbm(fname, width, height, rows):
+	rb = (width + 7) // 8
+	rows = memoryview(rows)
+	assert len(rows) >= rb * height
+	fo = open(fname, "wb")
+	fo.write(("P4\n%d %d\n" % (width, height)).encode("ascii"))
+	fo.write(rows[:rb * height].tobytes())
+	fo.close()
@@ -0,0 +1,147 @@
+#/usr/local/bin/python
+#
+# A stand-in for a Prologix GPIB-ETHERNET adapter, for trying out
+# prologix_usb.prologix_tcp without the hardware.
+#
+# It understands enough of the "++" protocol for prologix_usb, and
+# the "instruments" on the bus are python functions, which are given
+# each line written to them and return the answer (or None):
+#
+#	s = prologix_sim.server(12345)
+#	s.instr[5] = lambda x: "HP5370B" if x == "ID?" else None
+#	d = prologix_usb.gpib_dev("tcp:127.0.0.1:12345", 5)
+#	print(d.ask("ID?"))
+#
+# s.drop_after = n closes each connection after n lines, and s.drop()
+# closes them all right away, to see reconnects happen.  s.close()
+# takes the adapter off the net.
+#
+# Run on its own, it answers "ID?" with "SIM<address>" and echoes
+# everything else, on all addresses.
+#
+
+from __future__ import print_function
+
+import sys
+import socket
+import threading
+
+class server(object):
+
+	ver = "Prologix GPIB-ETHERNET Controller version 01.06.06.00"
+
+	def __init__(self, port=1234, host="127.0.0.1"):
+		self.instr = dict()
+		self.drop_after = None
+		self.conns = []
+		self.ls = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.ls.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.ls.bind((host, port))
+		self.ls.listen(5)
+		t = threading.Thread(target=self.accept, name="prologix_sim")
+		t.daemon = True
+		t.start()
+
+	def accept(self):
+		while True:
+			try:
+				c, a = self.ls.accept()
+			except socket.error:
+				return
+			self.conns.append(c)
+			t = threading.Thread(target=self.serve, args=(c,))
+			t.daemon = True
+			t.start()
+
+	# Stop listening and drop all connections, the adapter is gone
+	def close(self):
+		try:
+			self.ls.shutdown(socket.SHUT_RDWR)
+		except socket.error:
+			pass
+		self.ls.close()
+		self.drop()
+
+	def drop(self):
+		for c in self.conns:
+			try:
+				c.shutdown(socket.SHUT_RDWR)
+			except socket.error:
+				pass
+
+	###############################################################
+	# One connection, with adapter settings and output queues of
+	# its own.
+
+	def serve(self, c):
+		st = {
+			"addr": 0, "auto": 0, "eoi": 1, "eos": 0,
+			"eot_enable": 0, "eot_char": 0, "read_tmo_ms": 500,
+			"mode": 1, "savecfg": 0,
+		}
+		pending = dict()
+		buf = b""
+		n = 0
+		try:
+			while True:
+				x = c.recv(4096)
+				if len(x) == 0:
+					break
+				buf += x
+				while b"\r" in buf:
+					l, buf = buf.split(b"\r", 1)
+					l = l.strip(b"\n").decode("latin-1")
+					n += 1
+					if self.drop_after != None and n > self.drop_after:
+						return
+					r = self.line(l, st, pending)
+					if r:
+						c.sendall(r.encode("latin-1"))
+		except socket.error:
+			pass
+		finally:
+			c.close()
+			self.conns.remove(c)
+
+	def line(self, l, st, pending):
+		if l[:2] != "++":
+			a = st["addr"]
+			f = self.instr.get(a)
+			if f == None:
+				return None
+			r = f(l)
+			if r != None:
+				pending.setdefault(a, []).append(r)
+			return None
+		w = l[2:].split()
+		if len(w) == 0:
+			return None
+		c = w[0]
+		if c == "ver":
+			return self.ver + "\r\n"
+		if c in st:
+			if len(w) > 1:
+				st[c] = int(w[1])
+				return None
+			return "%d\r\n" % st[c]
+		if c == "read":
+			q = pending.get(st["addr"])
+			if not q:
+				return None
+			r = q.pop(0) + "\r\n"
+			if st["eot_enable"] and len(w) > 1 and w[1] == "eoi":
+				r += chr(st["eot_char"])
+			return r
+		if c in ("spoll", "srq"):
+			return "0\r\n"
+		return None
+
+if __name__ == "__main__":
+	port = 1234
+	if len(sys.argv) > 1:
+		port = int(sys.argv[1])
+	s = server(port, "")
+	for a in range(31):
+		s.instr[a] = lambda x, a=a: "SIM%d" % a if x == "ID?" else x
+	print("Prologix stand-in on port %d" % port)
+	threading.Event().wait()
@@ -4,12 +4,37 @@ from __future__ import print_function
 
 import sys
 import time
+import errno
+import select
+import socket
+import threading
+import concurrent.futures
 import serial
 import pylt
 
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
 pusb = dict()
+pusb_lock = threading.Lock()
+
+# The adapter talks bytes, the instrument classes talk str
+if sys.version_info < (3,0):
+	buf_str = str
+	def str_buf(s):
+		return s
+else:
+	def buf_str(b):
+		return bytes(b).decode("latin-1")
+	def str_buf(s):
+		if isinstance(s, (bytes, bytearray)):
+			return s
+		return s.encode("latin-1")
 
 ver = "Prologix GPIB-USB Controller version 6.95"
+ver_enet = "Prologix GPIB-ETHERNET Controller version "
 
 hwset = (
 		"addr",
@@ -29,32 +54,85 @@ def def_set(setting):
 	setting["eot_char"] = 0
 	setting["read_tmo_ms"] = 500
 	setting["rd_mode"] = "eoi"
+	setting["rd_idle_ms"] = None
 
 	setting["autocr"] = 1
 
 class prologix_usb(object):
 
+	ver = ver
+
 	def __init__(self, name):
 		self.name = name
 		self.debug_fd = open("_." + name, "w")
 		self.debug("====", "=============================")
 
-		self.ser = serial.Serial("/dev/" + name, 115200, timeout = 0.5)
+		self.ser = self.open_port()
+		# ++srq poll interval, backs off from first to second
+		self.srq_poll = (0.002, 0.050)
+		self.rbuf = bytearray()
+		# Thread consuming a rd_records() stream, if any
+		self.streaming = None
 		self.version_check()
 		self.curset = dict()
+		self.curkey = None
+		self.stats = {
+			"set": 0,
+			"switch": 0,
+			"cmds": 0,
+		}
+		self.switch_cost = dict()
 		self.rd_settings()
 		d = dict()
 		def_set(d)
 		self.set(d)
+
+		# All traffic with the adapter happens in this thread
+		self.q = queue.Queue()
+		self.thread = threading.Thread(target=self.io_thread,
+		    name="prologix " + name)
+		self.thread.daemon = True
+		self.thread.start()
 		pusb[name] = self
 
+	###############################################################
+	# Run the queued transactions, one at a time.
+	def io_thread(self):
+		while True:
+			f, func, args = self.q.get()
+			if not f.set_running_or_notify_cancel():
+				continue
+			try:
+				f.set_result(func(*args))
+			except Exception as e:
+				f.set_exception(e)
+
+	###############################################################
+	# Queue func(*args) to run as one atomic transaction on the
+	# adapter, return a concurrent.futures.Future for the result.
+	# Transactions submitted from inside a transaction run at once.
+	def submit(self, func, *args):
+		f = concurrent.futures.Future()
+		if threading.current_thread() is not self.thread:
+			self.q.put((f, func, args))
+			return f
+		f.set_running_or_notify_cancel()
+		try:
+			f.set_result(func(*args))
+		except Exception as e:
+			f.set_exception(e)
+		return f
+
 	def debug(self, pfx, str):
 		print((self.name, "%.6f" % time.time(), pfx, str),
 		    file=self.debug_fd)
 		self.debug_fd.flush()
 
+	def open_port(self):
+		return serial.Serial("/dev/" + self.name, 115200, timeout = 0.5)
+
 	def version_check(self):
-		self.ser.write("\r")
+		self.ser_wr("\r")
 		self.cmd("++mode 1")
 		self.cmd("++auto 0")
 		self.cmd("++addr 0")
@@ -62,13 +140,81 @@ class prologix_usb(object):
 		self.cmd("++ifc")
 		while True:
 			x = self.ask("++ver")
-			if x == ver:
+			if x.startswith(self.ver):
 				break;
-		assert x == ver
+		assert x.startswith(self.ver)
+
+	###############################################################
+	# Block reader
+	#
+	# Everything from the adapter is read into self.rbuf in as large
+	# chunks as the serial port has ready, and responses are cut
+	# off the front of it.
+	#
+
+	# Wait for at least one byte, then take all there is.
+	# Return number of bytes read, zero means timeout.
+	def rd_fill(self):
+		x = self.ser.read(max(self.ser.in_waiting, 1))
+		self.rbuf += x
+		return len(x)
+
+	def rd_take(self, n):
+		x = memoryview(self.rbuf)[:n].tobytes()
+		del self.rbuf[:n]
+		return x
+
+	# Read up to and including term, or whatever we have on timeout.
+	def rd_line(self, term=b"\n"):
+		i = 0
+		while True:
+			j = self.rbuf.find(term, i)
+			if j >= 0:
+				return self.rd_take(j + 1)
+			i = len(self.rbuf)
+			if self.rd_fill() == 0:
+				return self.rd_take(i)
+
+	# Wait up to idle seconds for more bytes to arrive
+	def rd_wait(self, idle):
+		te = time.time() + idle
+		while not self.ser.in_waiting:
+			if time.time() > te:
+				return False
+			time.sleep(.001)
+		return True
+
+	# Read nbr bytes, or fewer if the line goes idle for idle
+	# seconds after the first byte or times out.
+	def rd_count(self, nbr, idle=None):
+		while len(self.rbuf) < nbr:
+			if idle != None and len(self.rbuf) > 0:
+				if not self.rd_wait(idle):
+					break
+			if self.rd_fill() == 0:
+				break
+		x = self.rbuf[:nbr]
+		del self.rbuf[:nbr]
+		return x
+
+	# Same as rd_count(), but into the memoryview m, which saves
+	# allocating a new buffer for every read.  Returns the count.
+	def rd_into(self, m, idle=None):
+		nbr = len(m)
+		while len(self.rbuf) < nbr:
+			if idle != None and len(self.rbuf) > 0:
+				if not self.rd_wait(idle):
+					break
+			if self.rd_fill() == 0:
+				break
+		n = min(nbr, len(self.rbuf))
+		m[:n] = memoryview(self.rbuf)[:n]
+		del self.rbuf[:n]
+		return n
 
 	def ask(self, str):
 		self.cmd(str)
-		x = self.ser.readline()
+		x = buf_str(self.rd_line())
 		x = x.strip("\r\n")
 		self.debug("{r", x)
 		return (x)
@@ -77,54 +223,259 @@ class prologix_usb(object):
 		for i in hwset:
 			self.curset[i] = self.ask("++" + i)
 
+	def ser_wr(self, s):
+		self.ser.write(str_buf(s))
+
 	def cmd(self, str):
 		assert str[0:2] == "++"
 		self.debug("}w", str)
-		self.ser.write(str + "\r")
+		self.ser_wr(str + "\r")
+
+	# What ends a "++read eoi" response
+	def eoi_term(self):
+		if self.curset["eot_enable"] == "1":
+			return bytearray((int(self.curset["eot_char"]),))
+		return b"\n"
 
 	def rd_eoi(self):
 		self.cmd("++read eoi")
-		x = self.ser.readline()
+		x = buf_str(self.rd_line(self.eoi_term()))
 		self.debug("<eoi<",  x)
 		return (x)
 
 	def rd_chr(self, chr):
 		self.cmd("++read %d" % chr)
-		x = self.ser.readline()
+		x = buf_str(self.rd_line(bytearray((chr,))))
 		self.debug("<%d<" % chr,  x)
 		return (x)
 
-	def rd_bin(self, nbr, eoi = True):
+	###############################################################
+	# Stream EOI terminated records of reclen bytes, n of them or
+	# until stop is set if n is None.
+	#
+	# We keep up to "depth" "++read eoi" queued ahead of the records
+	# received, so the instrument does not wait for us.  The adapter
+	# must have eot_enable set, so eot_char follows each record, and
+	# that tells us if a record was garbled.
+	#
+	# A lost record is a "++read eoi" which timed out in the adapter
+	# and sent us nothing, so those are estimated from how long the
+	# serial port stayed quiet, one per read_tmo_ms.
+	#
+	# Bytearrays of whole records are passed to put(), then None.
+	# Returns counts of good, garbled and lost records.
+	#
+	# If anything fails, the "++read eoi" still queued in the adapter
+	# are drained, so they do not answer the next transaction.
+	#
+	def rd_records(self, n, reclen, put, stop, depth=64):
+		assert self.curset["eot_enable"] == "1"
+		m = int(self.curset["eot_char"])
+		mb = bytearray((m,))
+		tmo = int(self.curset["read_tmo_ms"]) * 1e-3
+		st = {"records": 0, "garbled": 0, "lost": 0}
+		asked = 0
+		got = 0
+		try:
+			while True:
+				k = depth - (asked - got)
+				if n != None:
+					k = min(k, n - asked)
+				if stop.is_set():
+					k = 0
+				if k > 0 and (k >= depth // 2 or asked == got):
+					self.debug("}w", "++read eoi (x%d)" % k)
+					self.ser_wr("++read eoi\r" * k)
+					asked += k
+				if asked == got:
+					break
+				t0 = time.time()
+				if self.rd_fill() == 0:
+					k = self.rd_lost(t0, tmo, asked - got)
+					st["lost"] += k
+					got += k
+					continue
+				b = self.rbuf
+				out = bytearray()
+				i = 0
+				while len(b) - i > reclen and got < asked:
+					if b[i + reclen] == m:
+						out += b[i:i + reclen]
+						i += reclen + 1
+						st["records"] += 1
+					else:
+						j = b.find(mb, i)
+						if j < 0:
+							break
+						i = j + 1
+						st["garbled"] += 1
+					got += 1
+				del b[:i]
+				if len(out) > 0:
+					put(out)
+		except Exception:
+			self.rd_drain(asked - got, mb, tmo)
+			raise
+		finally:
+			put(None)
+		self.debug("<rec<", str(st))
+		return st
+
+	# How many outstanding "++read eoi" timed out since t0, with
+	# nothing heard from the adapter.
+	def rd_lost(self, t0, tmo, k):
+		if tmo <= 0:
+			return k
+		return max(1, min(k, int((time.time() - t0) / tmo)))
+
+	# Throw away the answers to k "++read eoi" still in the adapter.
+	# Binary records may contain eot_char too, so once the count is
+	# used up we also read until the port goes quiet.
+	def rd_drain(self, k, mb, tmo):
+		self.debug("<drain<", "%d reads" % k)
+		try:
+			while k > 0:
+				t0 = time.time()
+				if self.rd_fill() == 0:
+					k -= self.rd_lost(t0, tmo, k)
+					continue
+				j = self.rbuf.rfind(mb)
+				if j >= 0:
+					k -= self.rbuf.count(mb)
+					del self.rbuf[:j + 1]
+			while self.rd_fill() > 0:
+				del self.rbuf[:]
+		except Exception as e:
+			self.debug("<drain<", "failed: " + str(e))
+		self.rbuf = bytearray()
+
+	###############################################################
+	# Read raw data with "++read eoi", passing it to put() in chunks
+	# as it arrives, until put() returns True.  If the instrument
+	# pauses, "++read eoi" is sent again, but after "tries" read
+	# timeouts in a row, we give up and return False.
+	#
+	def rd_chunks(self, put, tries=3):
+		self.cmd("++read eoi")
+		n = 0
+		while True:
+			if len(self.rbuf) == 0 and self.rd_fill() == 0:
+				n += 1
+				if n >= tries:
+					self.debug("<chunk<", "timeout")
+					return False
+				self.cmd("++read eoi")
+				continue
+			n = 0
+			x = self.rd_take(len(self.rbuf))
+			self.debug("<chunk<", "%d bytes" % len(x))
+			if put(x):
+				return True
+
+	def rd_bin(self, nbr, eoi = True, idle = None):
 		if eoi:
 			self.cmd("++read eoi")
 		else:
 			self.cmd("++read")
-		x = self.ser.read(nbr)
-		x = bytearray(x)
+		x = self.rd_count(nbr, idle)
 		self.debug("<%d/%d<" % (nbr, len(x)),  x)
 		return (x)
 
+	###############################################################
+	# Read a "#A" block: "#A", a 16 bit big-endian byte count and
+	# that many bytes, all with a single "++read eoi".
+	# Returns it all, header included, short if the read timed out.
+	def rd_block(self):
+		self.cmd("++read eoi")
+		x = self.rd_count(4)
+		if len(x) == 4 and x[:2] == b"#A":
+			x += self.rd_count((x[2] << 8) | x[3])
+		self.debug("<#A<", "%d bytes" % len(x))
+		return x
+
 	def wr(self, str):
 		assert str[0:2] != "++"
 		self.debug(">", str)
-		self.ser.write(str + "\r")
-
+		self.ser_wr(str + "\r")
+
+	###############################################################
+	# Pipelined questions: all the queries, each followed by its
+	# "++read", go out in one serial write, then we collect the
+	# answers.  This saves a serial round trip per query, but the
+	# adapter still sends each query and reads its answer before it
+	# gets to the next, so the GPIB traffic is the same as with ask().
+	def ask_many(self, ql, mode="eoi"):
+		if mode == "eoi":
+			rc = "\r++read eoi\r"
+			term = self.eoi_term()
+		else:
+			rc = "\r++read %d\r" % mode
+			term = bytearray((mode,))
+		l = list()
+		for q in ql:
+			assert q[0:2] != "++"
+			self.debug(">", q)
+			l.append(q + rc)
+		self.ser_wr("".join(l))
+		r = list()
+		for q in ql:
+			x = buf_str(self.rd_line(term))
+			self.debug("<%s<" % str(mode), x)
+			r.append(x)
+		return r
+
+	###############################################################
+	# Bring the adapter settings in line with settings.
+	#
+	# Nothing is sent if settings are the same as last time, otherwise
+	# all the changed settings go out in a single serial write.
+	#
 	def set(self, settings):
+		self.stats["set"] += 1
+		key = tuple([settings.get(i) for i in hwset])
+		if key == self.curkey:
+			return
+		l = list()
 		for i in hwset:
 			if i not in settings:
 				continue
 			if str(settings[i]) == self.curset[i]:
 				continue
-			self.cmd("++" + i + "  %d" % settings[i])
+			l.append("++" + i + "  %d" % settings[i])
 			self.curset[i] = "%d" % settings[i]
 		if "read_tmo_ms" in settings:
-			to = settings["read_tmo_ms"]
-			self.ser.timeout = (to + 500) * 1e-3
+			to = (settings["read_tmo_ms"] + 500) * 1e-3
+			if to != self.ser.timeout:
+				self.ser.timeout = to
+		self.curkey = key
+		if len(l) == 0:
+			return
+		for i in l:
+			self.debug("}w", i)
+		self.ser_wr("\r".join(l) + "\r")
+		self.stats["switch"] += 1
+		self.stats["cmds"] += len(l)
+		if "addr" in settings:
+			c = self.switch_cost.setdefault(settings["addr"], [0, 0])
+			c[0] += 1
+			c[1] += len(l)
+
+	###############################################################
+	# Report how many adapter commands switching between the
+	# instruments on this adapter has cost.
+	def report_stats(self, f=sys.stdout):
+		f.write("%s: %d set() calls, %d switches, %d commands\n" % (
+		    self.name, self.stats["set"], self.stats["switch"],
+		    self.stats["cmds"]))
+		for i in sorted(self.switch_cost):
+			n, c = self.switch_cost[i]
+			f.write("  addr %s: %d switches, %d commands (%.2f/switch)\n"
+			    % (str(i), n, c, float(c) / n))
 
 	def spoll(self):
 		self.cmd("++spoll")
 		while True:
-			a = self.ser.readline()
+			a = buf_str(self.rd_line())
 			self.debug("<sp<", a)
 			if a.strip().isdigit():
 				break
@@ -133,14 +484,170 @@ class prologix_usb(object):
 	def trigger(self):
 		self.cmd("++trg")
 
+	###############################################################
+	# Check the SRQ line with "++srq".  This is answered by the
+	# adapter itself and does not touch the GPIB bus, so we can
+	# afford to ask often.
+	def srq(self):
+		self.ser_wr("++srq\r")
+		x = buf_str(self.rd_line()).strip()
+		if x == "1":
+			self.debug("{srq", x)
+			return True
+		return False
+
 	def clear(self):
 		self.cmd("++clr")
 
+#######################################################################
+# A socket which looks enough like a serial.Serial for prologix_usb
+#
+# It is non-blocking with Nagle disabled.  If the connection fails,
+# whatever transaction was going on is lost, so we raise PyltError,
+# but connect again first, and if that fails too, at the start of
+# every following read or write, until it works.
+#
+class tcp_port(object):
+
+	def __init__(self, host, port, timeout=0.5, reconnected=None):
+		self.host = host
+		self.port = port
+		self.timeout = timeout
+		self.reconnected = reconnected
+		self.buf = bytearray()
+		self.sock = None
+		self.connecting = False
+		self.connect()
+
+	def fail(self, s):
+		raise pylt.PyltError("tcp:%s:%d" % (self.host, self.port), s)
+
+	def connect(self):
+		try:
+			s = socket.create_connection((self.host, self.port), 5)
+		except socket.error as e:
+			self.fail("Cannot connect: " + str(e))
+		s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		s.setblocking(False)
+		self.sock = s
+
+	def reconnect(self):
+		self.connecting = True
+		try:
+			self.connect()
+			if self.reconnected != None:
+				self.reconnected()
+		finally:
+			self.connecting = False
+
+	# Make sure we are connected before talking to the adapter
+	def check(self):
+		if self.sock == None and not self.connecting:
+			self.reconnect()
+
+	def lost(self, why):
+		if self.sock != None:
+			self.sock.close()
+		self.sock = None
+		self.buf = bytearray()
+		self.check()
+		self.fail("Connection lost: " + why)
+
+	# Wait up to tmo seconds for data, and append all there is to buf
+	def pull(self, tmo):
+		self.check()
+		try:
+			r,w,e = select.select([self.sock], [], [], tmo)
+			if not r:
+				return
+			x = self.sock.recv(65536)
+		except socket.error as e:
+			if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+				return
+			self.lost(str(e))
+		if len(x) == 0:
+			self.lost("closed by adapter")
+		self.buf += x
+
+	@property
+	def in_waiting(self):
+		self.pull(0)
+		return len(self.buf)
+
+	def read(self, n=1):
+		te = time.time() + self.timeout
+		while len(self.buf) < n:
+			t = te - time.time()
+			if t <= 0:
+				break
+			self.pull(t)
+		x = memoryview(self.buf)[:n].tobytes()
+		del self.buf[:n]
+		return x
+
+	def write(self, s):
+		if not isinstance(s, bytes):
+			s = s.encode("latin-1")
+		self.check()
+		try:
+			self.send(s)
+		except socket.error as e:
+			self.lost(str(e))
+
+	def send(self, s):
+		s = memoryview(s)
+		while len(s) > 0:
+			r,w,e = select.select([], [self.sock], [], self.timeout)
+			if not w:
+				raise socket.timeout("send")
+			try:
+				n = self.sock.send(s)
+			except socket.error as e:
+				if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+					continue
+				raise
+			s = s[n:]
+
+#######################################################################
+# Prologix GPIB-ETHERNET, name is "tcp:<host>" or "tcp:<host>:<port>"
+#
+class prologix_tcp(prologix_usb):
+
+	ver = ver_enet
+
+	def open_port(self):
+		x = self.name.split(":")
+		if len(x) > 2:
+			port = int(x[2])
+		else:
+			port = 1234
+		return tcp_port(x[1], port, 0.5, self.reconnected)
+
+	# Every transaction starts here, so get the connection back
+	# first, if it was lost, and then the settings go out again.
+	def set(self, settings):
+		self.ser.check()
+		prologix_usb.set(self, settings)
+
+	# Forget what we know about the adapter, and what we were reading
+	def reconnected(self):
+		self.debug("====", "reconnected")
+		self.rbuf = bytearray()
+		self.curkey = None
+		self.curset = dict((i, "") for i in hwset)
+		self.cmd("++mode 1")
+		self.cmd("++auto 0")
+
 class gpib_dev(pylt.pylt):
 
 	def __init__(self, name, adr):
-		if not name in pusb:
-			x = prologix_usb(name)
+		with pusb_lock:
+			if name in pusb:
+				pass
+			elif name[:4] == "tcp:":
+				x = prologix_tcp(name)
+			else:
+				x = prologix_usb(name)
 
 		self.pusb = pusb[name]
 		self.debug_fd = self.pusb.debug_fd
@@ -150,30 +657,64 @@ class gpib_dev(pylt.pylt):
 		def_set(self.setting)
 		self.setting["addr"] = adr
 
+	###############################################################
+	# Queue func(*args) as one transaction on the adapter, with
+	# the settings for this instrument, and return a future.
+	#
+	# Instruments sharing an adapter can thus be used from
+	# several threads:
+	#	f = d.submit(d.ask, "ID?")
+	#	print(f.result())
+	#
+	def submit(self, func, *args):
+		if self.pusb.streaming is threading.current_thread():
+			self.fail("Adapter busy with rd_records() in this thread")
+		return self.pusb.submit(self.xact, func, args)
+
+	def xact(self, func, args):
+		self.pusb.set(self.setting)
+		return func(*args)
 
 	def wr(self, str):
-		self.pusb.set(self.setting)
-		self.pusb.wr(str)
+		self.submit(self.pusb.wr, str).result()
 
 	def rd_eoi(self, tmo=None, fail=True):
-		self.pusb.set(self.setting)
-		x = self.pusb.rd_eoi()
+		x = self.submit(self.pusb.rd_eoi).result()
 		if self.setting["autocr"]:
 			x = x.strip("\r\n")
 		return (x)
 
 	def rd_chr(self, chr=10, tmo=None, fail=True):
-		self.pusb.set(self.setting)
-		x = self.pusb.rd_chr(chr)
+		x = self.submit(self.pusb.rd_chr, chr).result()
 		if self.setting["autocr"]:
 			x = x.strip("\r\n")
 		return (x)
 
+	###############################################################
+	# Read cnt bytes of binary data.
+	#
+	# Instruments which may send fewer bytes can set "rd_idle_ms"
+	# to end the read once the adapter has been quiet that long,
+	# instead of waiting out the read timeout.  It is off by default,
+	# since a pause on the bus would then cut the transfer short.
 	def rd_bin(self, cnt=1, tmo=None, fail=True):
-		self.pusb.set(self.setting)
-		x = self.pusb.rd_bin(cnt)
+		idle = self.setting["rd_idle_ms"]
+		if idle != None:
+			idle *= 1e-3
+		x = self.submit(self.pusb.rd_bin, cnt, True, idle).result()
 		return (x)
 
+	###############################################################
+	# "#A" block transfer, see prologix_usb.rd_block()
+	def rd_block(self):
+		return self.submit(self.pusb.rd_block).result()
+
+	###############################################################
+	# Binary transfer in chunks, see prologix_usb.rd_chunks().
+	# put() runs in the adapters I/O thread, as the data arrives.
+	def rd_chunks(self, put, tries=3):
+		return self.submit(self.pusb.rd_chunks, put, tries).result()
+
 	def rd(self, tmo=None, fail=True):
 		m = self.setting["rd_mode"]
 		if m == "eoi":
@@ -181,18 +722,76 @@ class gpib_dev(pylt.pylt):
 		else:
 			return self.rd_chr(m)
 
+	def ask(self, q, tmo=None, fail=True):
+		return self.submit(pylt.pylt.ask, self, q, tmo, fail).result()
+
+	###############################################################
+	# Generator on top of prologix_usb.rd_records(), yielding
+	# bytearrays of whole records.  The counts of good, garbled
+	# and lost records end up in self.rd_stats.
+	#
+	# The stream holds the adapter until it ends, so the loop body
+	# must not use any instrument on the same adapter: that would
+	# wait for a stream which only ends when the loop does.  Such
+	# calls fail instead, see submit().
+	#
+	def rd_records(self, n=None, reclen=1, depth=64):
+		q = queue.Queue()
+		stop = threading.Event()
+		f = self.submit(self.pusb.rd_records, n, reclen, q.put, stop,
+		    depth)
+		self.pusb.streaming = threading.current_thread()
+		try:
+			while True:
+				x = q.get()
+				if x == None:
+					break
+				yield x
+		finally:
+			stop.set()
+			self.pusb.streaming = None
+			self.rd_stats = f.result()
+
+	###############################################################
+	# Send the queries "depth" at a time, in one serial write
+	# each (see prologix_usb.ask_many()).
+	def ask_many(self, ql, depth=16):
+		r = list()
+		for i in range(0, len(ql), depth):
+			r += self.submit(self.pusb.ask_many, ql[i:i + depth],
+			    self.setting["rd_mode"]).result()
+		if self.setting["autocr"]:
+			r = [x.strip("\r\n") for x in r]
+		return r
+
 	def attr(self, name, val):
 		self.setting[name] = val
 
 	def spoll(self):
-		self.pusb.set(self.setting)
-		return(self.pusb.spoll())
+		return(self.submit(self.pusb.spoll).result())
 
 	def trigger(self):
-		self.pusb.set(self.setting)
-		return(self.pusb.trigger())
+		return(self.submit(self.pusb.trigger).result())
+
+	###############################################################
+	# The Prologix adapter does not tell us when SRQ is asserted, so
+	# this is still polling, of the adapter with "++srq", not of the
+	# instrument over the bus.  The interval starts at srq_poll[0]
+	# and doubles up to srq_poll[1].
+	#
+	# Each "++srq" is a transaction of its own, so other instruments
+	# on the adapter can get their work done while we wait.
+	def wait_srq(self, tmo):
+		te = time.time() + tmo * 1e-3
+		dt, dtmax = self.pusb.srq_poll
+		while True:
+			if self.pusb.submit(self.pusb.srq).result():
+				return True
+			if time.time() >= te:
+				return False
+			time.sleep(min(dt, max(te - time.time(), 0)))
+			dt = min(dt + dt, dtmax)
 
 	def clear(self):
-		self.pusb.set(self.setting)
-		self.pusb.clear()
+		self.submit(self.pusb.clear).result()
 
@@ -10,6 +10,29 @@
 
 import sys
 import time
+import array
+
+#######################################################################
+# array <-> bytes, for both python 2 and 3
+#
+# arr_fill() overwrites all of array "a" in place with bytes "b", which
+# must be exactly as long.  (Python 2 arrays cannot be written through
+# a memoryview, so there it takes a copy.)
+#
+if sys.version_info < (3,0):
+	def arr_frombytes(a, b):
+		a.fromstring(b)
+	def arr_tobytes(a):
+		return a.tostring()
+	def arr_fill(a, b):
+		a[:] = array.array(a.typecode, memoryview(b).tobytes())
+else:
+	def arr_frombytes(a, b):
+		a.frombytes(b)
+	def arr_tobytes(a):
+		return a.tobytes()
+	def arr_fill(a, b):
+		memoryview(a).cast("B")[:] = b
 
 class PyltError(Exception):
 	def __init__(self, id, reason):
@@ -72,6 +95,13 @@ class pylt(object):
 		self.wr(q)
 		return self.rd(tmo=tmo, fail=fail)
 
+	###############################################################
+	# Ask a list of questions, return list of answers
+	# Transports which can, send the questions pipelined, up to
+	# depth at a time.
+	def ask_many(self, ql, tmo = None, depth = None):
+		return [self.ask(q, tmo=tmo) for q in ql]
+
 	###############################################################
 	# Raise exception if the instrument reports errors
 	def AOK(self):
@@ -101,18 +131,48 @@ class pylt(object):
 		    "PYLT.WARN: [%s].spoll() undefined\n" % self.id)
 		return 0
 
+	###############################################################
+	# Make the instrument assert SRQ when any of bits turn on in
+	# spoll().  bits=0 disables SRQ again.
+	# Return the previous SRQ mask, or None if the instrument cannot
+	# do this.
+	def srq_enable(self, bits):
+		return None
+
+	###############################################################
+	# Wait for a service request to arrive from the transport.
+	# Return True if SRQ was seen, False on timeout and None if the
+	# transport cannot tell us about SRQ.
+	def wait_srq(self, tmo):
+		return None
+
 	###############################################################
 	# Wait for a bits to turn on in spoll()
 	#
+	# If both instrument and transport can do SRQ we sleep until
+	# the SRQ arrives, and only then serial poll, otherwise we
+	# fall back to polling with exponential backoff.  The SRQ mask
+	# of the instrument is put back as it was afterwards.
+	#
+	# (How the transport waits for SRQ varies, Prologix adapters
+	# have to be asked about the SRQ line, see gpib_dev.wait_srq())
+	#
 	def wait_spoll(self, bits, tmo = 10000.):
 		self.debug("SPOLL WAITING FOR %02x" % bits)
 		assert bits > 0 or "wait_spoll bits" == "must > 0"
 		assert bits < 256 or "wait_spoll bits" == "must be < 256"
-		obits = 256
 		te = time.time() + tmo * 1e-3
-		x = 0
+		m = self.srq_enable(bits)
+		if m != None:
+			try:
+				r = self.wait_spoll_srq(bits, te)
+			finally:
+				self.srq_enable(m)
+			if r != None:
+				return r
+		obits = 0
 		dt = 0.001
-		while time.time() < te:
+		while True:
 			x = self.spoll()
 			if x != obits:
 				self.debug("SPOLL CHG %02x -> %02x" %
@@ -120,10 +180,36 @@ class pylt(object):
 				obits = x
 			if x & bits:
 				return True
+			if time.time() >= te:
+				return False
 			time.sleep(dt)
 			if dt < 3:
 				dt += dt
-		return False
+
+	###############################################################
+	# SRQ driven part of wait_spoll()
+	# Return None if the transport cannot wait for SRQ.
+	#
+	def wait_spoll_srq(self, bits, te):
+		dt = 0.001
+		r = False
+		while True:
+			x = self.spoll()
+			self.debug("SPOLL SRQ=%s %02x" % (str(r), x))
+			if x & bits:
+				return True
+			t = te - time.time()
+			if t <= 0:
+				return False
+			if r:
+				# Somebody else on the bus wants service,
+				# don't spin on their SRQ.
+				time.sleep(dt)
+				if dt < .1:
+					dt += dt
+			r = self.wait_srq(t * 1e3)
+			if r == None:
+				return None
 
 	###############################################################
 	# Wait until instrument is ready.
@@ -0,0 +1,129 @@
+#!/usr/local/bin/python
+#
+# asyncio front-end for PYLT instruments (Python 3 only)
+#
+# Each instrument gets a worker thread of its own, which runs the
+# methods we are asked to await, one at a time, in order.  The
+# transfers these do are transactions on the adapters I/O thread
+# (see prologix_usb.gpib_dev.submit()), so an instrument which sleeps
+# or polls in the middle of measure() only holds up itself, not the
+# other instruments on the bus.  The event loop never blocks, so one
+# loop can drive many instruments on several adapters at the same time.
+#
+# Usage:
+#	g = pylt_async.async_dev(hp3336c.hp3336c())
+#	m = pylt_async.async_dev(u2004a.u2004a())
+#	await g.set_freq(1e6)
+#	x = await m.measure()
+#
+# Any method of the wrapped instrument can be awaited this way.
+# wait_spoll(), wait_cmd() and wait_data() are done in the event
+# loop, so the adapter is free for other instruments while we wait.
+#
+
+import asyncio
+import concurrent.futures
+import functools
+import time
+
+class async_dev(object):
+
+	def __init__(self, dev):
+		self.dev = dev
+		# The worker thread lives with the instrument, so all
+		# async_dev wrappers of it share it.
+		if not hasattr(dev, "async_worker"):
+			dev.async_worker = concurrent.futures.ThreadPoolExecutor(1)
+		self.worker = dev.async_worker
+
+	###############################################################
+	# Run func(*args) on the instruments worker thread
+	def call(self, func, *args, **kwargs):
+		f = functools.partial(func, *args, **kwargs)
+		return asyncio.get_event_loop().run_in_executor(self.worker, f)
+
+	def __getattr__(self, name):
+		a = getattr(self.dev, name)
+		if not callable(a):
+			return a
+		@functools.wraps(a)
+		def f(*args, **kwargs):
+			return self.call(a, *args, **kwargs)
+		return f
+
+	###############################################################
+	# PYLT canonical methods
+
+	def wr(self, s):
+		return self.call(self.dev.wr, s)
+
+	def rd(self, tmo=None, fail=True):
+		return self.call(self.dev.rd, tmo=tmo, fail=fail)
+
+	def ask(self, q, tmo=None, fail=True):
+		return self.call(self.dev.ask, q, tmo=tmo, fail=fail)
+
+	def spoll(self):
+		return self.call(self.dev.spoll)
+
+	def trigger(self):
+		return self.call(self.dev.trigger)
+
+	###############################################################
+	# Same as pylt.wait_spoll() but the waiting is done in the
+	# event loop.  SRQ waits are done in short slices so other
+	# instruments on the same adapter get their turn.
+	#
+	async def wait_spoll(self, bits, tmo = 10000., slice = 50.):
+		assert bits > 0 or "wait_spoll bits" == "must > 0"
+		assert bits < 256 or "wait_spoll bits" == "must be < 256"
+		te = time.time() + tmo * 1e-3
+		m = await self.call(self.dev.srq_enable, bits)
+		if m != None:
+			try:
+				r = await self.wait_spoll_srq(bits, te, slice)
+			finally:
+				await self.call(self.dev.srq_enable, m)
+			if r != None:
+				return r
+		dt = 0.001
+		while True:
+			x = await self.spoll()
+			if x & bits:
+				return True
+			if time.time() >= te:
+				return False
+			await asyncio.sleep(min(dt, max(te - time.time(), 0)))
+			if dt < 3:
+				dt += dt
+
+	async def wait_spoll_srq(self, bits, te, slice):
+		if (await self.spoll()) & bits:
+			return True
+		while True:
+			t = min(slice, (te - time.time()) * 1e3)
+			if t <= 0:
+				return ((await self.spoll()) & bits) != 0
+			r = await self.call(self.dev.wait_srq, t)
+			if r == None:
+				return None
+			if not r:
+				continue
+			if (await self.spoll()) & bits:
+				return True
+			# Somebody else on the bus wants service
+			await asyncio.sleep(.01)
+
+	async def wait_cmd(self, tmo = 10000, fail=True):
+		if await self.wait_spoll(self.dev.spoll_cmd, tmo):
+			return True
+		if not fail:
+			return False
+		self.dev.fail("Timeout waiting for cmd")
+
+	async def wait_data(self, tmo = 10000, fail=True):
+		if await self.wait_spoll(self.dev.spoll_data, tmo):
+			return True
+		if not fail:
+			return False
+		self.dev.fail("Timeout waiting for data")
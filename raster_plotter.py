@@ -0,0 +1,148 @@
+#/usr/local/bin/python
+#
+# A pen plotter which outputs bitmaps, PNG or PBM files, with the same
+# interface as svg_plotter
+#
+# The picture is drawn into a numpy framebuffer.  Vectors are
+# collected and drawn in batches, all the pixels of a batch in one
+# go, by numpy indexing.
+#
+# Width is in pixels, the height follows from the bbox, unless given.
+# A filename ending in ".pbm" gives a black and white bitmap where
+# everything which is not background is black.
+#
+
+import numpy
+
+import png_util
+
+colors = {
+	"black":	(0, 0, 0),
+	"white":	(255, 255, 255),
+	"red":		(255, 0, 0),
+	"green":	(0, 255, 0),
+	"blue":		(0, 0, 255),
+	"cyan":		(0, 255, 255),
+	"magenta":	(255, 0, 255),
+	"yellow":	(255, 255, 0),
+	"gray":		(128, 128, 128),
+}
+
+def color(c):
+	if c[:1] == "#":
+		return (int(c[1:3], 16), int(c[3:5], 16), int(c[5:7], 16))
+	return colors[c]
+
+class plotter():
+
+	def __init__(self, fname="_.png"):
+		self.fname = fname
+		self.width = 1024
+		self.height = None
+		self.bbox_coord = None
+		self.bgcolor = "white"
+		self.__pencolor = "black"
+		self.__penwidth = 3
+		self.segs = []
+		self.fb = None
+		self.x = 0
+		self.y = 0
+
+	def size(self, width, height):
+		self.width = width
+		self.height = height
+
+	def bbox(self, x0, y0, x1, y1):
+		self.bbox_coord = (x0,y0,x1,y1)
+
+	def background(self, col):
+		self.bgcolor = col
+
+	def start(self):
+		if self.bbox_coord == None:
+			self.bbox_coord = (0, 0, self.width, self.height)
+		x0, y0, x1, y1 = self.bbox_coord
+		self.scale = self.width / float(x1 - x0)
+		if self.height == None:
+			self.height = int(round((y1 - y0) * self.scale))
+		self.fb = numpy.empty((self.height, self.width, 3),
+		    dtype=numpy.uint8)
+		self.fb[:,:] = color(self.bgcolor)
+		self.x = 0
+		self.y = 0
+
+	def pencolor(self, pencolor):
+		if pencolor == self.__pencolor:
+			return
+		self.flush()
+		self.__pencolor = pencolor
+
+	def penwidth(self, penwidth):
+		if penwidth == self.__penwidth:
+			return
+		self.flush()
+		self.__penwidth = penwidth
+
+	def comment(self, c):
+		return
+
+	def vector(self, x, y, draw):
+		if draw:
+			self.segs += (self.x, self.y, x, y)
+			if len(self.segs) > 65536:
+				self.flush()
+		self.x = x
+		self.y = y
+
+	###############################################################
+	# Draw the collected vectors with the current pen
+
+	def flush(self):
+		if len(self.segs) == 0:
+			return
+		s = numpy.array(self.segs, dtype=float).reshape(-1, 4)
+		self.segs = []
+		x0, y0 = self.bbox_coord[:2]
+		s -= (x0, y0, x0, y0)
+		s *= self.scale
+		dx = s[:,2] - s[:,0]
+		dy = s[:,3] - s[:,1]
+		n = numpy.ceil(numpy.maximum(abs(dx), abs(dy))).astype(int) + 1
+		# One point per pixel along each vector
+		i = numpy.repeat(numpy.arange(len(n)), n)
+		t = numpy.arange(n.sum()) - numpy.repeat(numpy.cumsum(n) - n, n)
+		t = t / numpy.maximum(n[i] - 1, 1).astype(float)
+		x = numpy.rint(s[i,0] + dx[i] * t).astype(int)
+		y = numpy.rint(s[i,1] + dy[i] * t).astype(int)
+		r = max(self.__penwidth * self.scale * .5, .5)
+		k = int(r)
+		c = color(self.__pencolor)
+		h, w = self.fb.shape[:2]
+		for oy in range(-k, k + 1):
+			for ox in range(-k, k + 1):
+				if ox * ox + oy * oy > r * r:
+					continue
+				xx = x + ox
+				yy = y + oy
+				ok = (xx >= 0) & (xx < w) & (yy >= 0) & (yy < h)
+				self.fb[yy[ok], xx[ok]] = c
+
+	def stop(self):
+		self.flush()
+		if self.fname[-4:] == ".pbm":
+			b = (self.fb != color(self.bgcolor)).any(axis=2)
+			b = numpy.packbits(b, axis=1)
+			png_util.pbm(self.fname, self.width, self.height,
+			    b.tobytes())
+		else:
+			png_util.png(self.fname, self.width, self.height,
+			    self.fb.tobytes())
+
+if __name__ == "__main__":
+	p = plotter()
+	p.bbox(0, 0, 200, 150)
+	p.start()
+	p.vector(0,0, False)
+	p.vector(100,100, True)
+	p.vector(10,100, True)
+	p.stop()
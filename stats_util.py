@@ -0,0 +1,249 @@
+#/usr/local/bin/python
+
+import math
+import sys
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+#######################################################################
+# Streaming statistics over blocks of samples, typically time interval
+# measurements from the hp5370b:
+#
+#	s = stats_util.stream_stats(tau0 = 1e-3, hist = (-1e-9, 1e-9, 100))
+#	for x in d.stream():
+#		s.add(*d.bintofloat_batch(x))
+#	s.report()
+#
+# Samples are taken to be phase (time error) data, spaced tau0 apart.
+#
+# Mean, variance (Chan/Welford), min/max and histogram are kept in a few
+# accumulators.  Overlapping Allan deviation and TDEV are computed over
+# all terms (not estimated from a subset) for tau = m * tau0, m = 1, 2,
+# 4 ... m_max, from a tail of the last 3 * m_max samples, shared by all
+# taus, plus a count and a sum of squares per tau.
+#
+# The MDEV/TDEV terms come from differences of prefix sums, which is
+# where the rounding goes: the sums are taken relative to the first
+# good sample of each block, so a constant phase offset costs nothing,
+# but with a large frequency offset the prefix sums grow and the
+# smallest taus lose some digits to cancellation.
+#
+# Bad samples (NaN, +/-inf, or flagged in the "bad" argument to add())
+# are left out of everything, including any Allan/TDEV term which spans
+# them.
+#
+# If numpy is available the blocks are processed vectorised, otherwise
+# the same is done, slowly, in plain python.
+#
+
+def finite(v):
+	return not (math.isnan(v) or math.isinf(v))
+
+class stream_stats(object):
+
+	def __init__(self, tau0 = 1.0, m_max = 1024, hist = None):
+		self.tau0 = tau0
+		self.m = []
+		m = 1
+		while m <= m_max:
+			self.m.append(m)
+			m += m
+		self.tail = 3 * self.m[-1]
+		self.buf = []
+		self.nbad = 0
+		self.n = 0
+		self.mean = 0.
+		self.m2 = 0.
+		self.min = None
+		self.max = None
+		self.hist = hist
+		if hist != None:
+			self.bins = [0] * (hist[2] + 2)
+		self.an = [0] * len(self.m)
+		self.asum = [0.] * len(self.m)
+		self.mn = [0] * len(self.m)
+		self.msum = [0.] * len(self.m)
+
+	###############################################################
+	# Add a block of samples, with an optional sequence of flags
+	# for bad samples, such as returned by hp5370b.bintofloat_batch()
+
+	def add(self, x, bad = None):
+		if numpy != None:
+			self.add_numpy(x, bad)
+		else:
+			self.add_python(x, bad)
+
+	def add_numpy(self, x, bad):
+		x = numpy.asarray(x, dtype=numpy.float64)
+		ok = numpy.isfinite(x)
+		if bad is not None:
+			ok &= numpy.logical_not(numpy.asarray(bad, dtype=bool))
+		self.nbad += len(x) - int(ok.sum())
+		self.moments(x[ok])
+		b = numpy.concatenate((numpy.asarray(self.buf), x))
+		bok = numpy.concatenate(
+		    (numpy.isfinite(self.buf), ok)).astype(numpy.int64)
+		t = len(b) - len(x)
+		b = numpy.where(bok, b, 0.)
+		# Prefix sums of samples and good flags, local to this block
+		x0 = b[bok != 0][:1].sum()
+		p = numpy.concatenate(([0.], numpy.cumsum(
+		    numpy.where(bok, b - x0, 0.))))
+		q = numpy.concatenate(([0], numpy.cumsum(bok)))
+		for k, m in enumerate(self.m):
+			# Overlapping Allan: x[i+2m] - 2x[i+m] + x[i]
+			i = numpy.arange(max(t - 2 * m, 0), len(b) - 2 * m)
+			d = b[i + 2 * m] - 2 * b[i + m] + b[i]
+			d = d[(bok[i] & bok[i + m] & bok[i + 2 * m]) != 0]
+			self.an[k] += len(d)
+			self.asum[k] += float(numpy.dot(d, d))
+			# Modified Allan: the same, summed over m i's
+			j = numpy.arange(max(t - 3 * m + 1, 0), len(b) - 3 * m + 1)
+			d = (p[j + 3 * m] - 3 * p[j + 2 * m] +
+			    3 * p[j + m] - p[j])
+			d = d[q[j + 3 * m] - q[j] == 3 * m]
+			self.mn[k] += len(d)
+			self.msum[k] += float(numpy.dot(d, d))
+		b[bok == 0] = numpy.nan
+		self.buf = b[-self.tail:].copy()
+
+	def add_python(self, x, bad):
+		g = []
+		b = list(self.buf)
+		t = len(b)
+		for i, v in enumerate(x):
+			if not finite(v) or (bad is not None and bad[i]):
+				self.nbad += 1
+				b.append(float("nan"))
+			else:
+				g.append(v)
+				b.append(v)
+		self.moments(g)
+		bok = [v == v for v in b]
+		x0 = ([v for v, o in zip(b, bok) if o] + [0.])[0]
+		p = [0.]
+		q = [0]
+		for v, o in zip(b, bok):
+			p.append(p[-1] + (v - x0) if o else p[-1])
+			q.append(q[-1] + o)
+		for k, m in enumerate(self.m):
+			for i in range(max(t - 2 * m, 0), len(b) - 2 * m):
+				if bok[i] and bok[i + m] and bok[i + 2 * m]:
+					d = b[i + 2 * m] - 2 * b[i + m] + b[i]
+					self.an[k] += 1
+					self.asum[k] += d * d
+			for j in range(max(t - 3 * m + 1, 0), len(b) - 3 * m + 1):
+				if q[j + 3 * m] - q[j] == 3 * m:
+					d = (p[j + 3 * m] - 3 * p[j + 2 * m] +
+					    3 * p[j + m] - p[j])
+					self.mn[k] += 1
+					self.msum[k] += d * d
+		self.buf = b[-self.tail:]
+
+	###############################################################
+	# Combine the mean/variance of a block of good samples into the
+	# running totals (Chan et al.), and update min/max/histogram
+
+	def moments(self, x):
+		n = len(x)
+		if n == 0:
+			return
+		if numpy != None:
+			mn = float(x.mean())
+			m2 = float(((x - mn) ** 2).sum())
+			lo = float(x.min())
+			hi = float(x.max())
+		else:
+			mn = math.fsum(x) / n
+			m2 = math.fsum([(v - mn) ** 2 for v in x])
+			lo = min(x)
+			hi = max(x)
+		d = mn - self.mean
+		nn = self.n + n
+		self.mean += d * n / nn
+		self.m2 += m2 + d * d * self.n * n / nn
+		self.n = nn
+		if self.min == None or lo < self.min:
+			self.min = lo
+		if self.max == None or hi > self.max:
+			self.max = hi
+		if self.hist != None:
+			self.histogram(x)
+
+	def histogram(self, x):
+		lo, hi, nb = self.hist
+		w = (hi - lo) / float(nb)
+		if numpy != None:
+			i = numpy.floor((x - lo) / w)
+			i = numpy.clip(i, -1, nb).astype(numpy.int64) + 1
+			c = numpy.bincount(i, minlength=nb + 2)
+			for j, v in enumerate(c):
+				self.bins[j] += int(v)
+			return
+		for v in x:
+			i = int(math.floor((v - lo) / w))
+			self.bins[min(max(i, -1), nb) + 1] += 1
+
+	###############################################################
+	# Results
+
+	def variance(self):
+		if self.n < 2:
+			return None
+		return self.m2 / (self.n - 1)
+
+	def stddev(self):
+		v = self.variance()
+		if v == None:
+			return None
+		return math.sqrt(v)
+
+	# Returns (underflow, [bins], overflow)
+	def histo(self):
+		return (self.bins[0], self.bins[1:-1], self.bins[-1])
+
+	# Returns list of (tau, adev, number of terms)
+	def adev(self):
+		l = []
+		for k, m in enumerate(self.m):
+			n = self.an[k]
+			if n == 0:
+				continue
+			tau = m * self.tau0
+			l.append((tau, math.sqrt(self.asum[k] / (2 * n)) / tau, n))
+		return l
+
+	# Returns list of (tau, mdev, number of terms)
+	def mdev(self):
+		l = []
+		for k, m in enumerate(self.m):
+			n = self.mn[k]
+			if n == 0:
+				continue
+			tau = m * self.tau0
+			l.append((tau,
+			    math.sqrt(self.msum[k] / (2 * n)) / (m * tau), n))
+		return l
+
+	# Returns list of (tau, tdev, number of terms)
+	def tdev(self):
+		l = []
+		for tau, md, n in self.mdev():
+			l.append((tau, tau * md / math.sqrt(3), n))
+		return l
+
+	def report(self, f = sys.stdout):
+		f.write("N %d  bad %d\n" % (self.n, self.nbad))
+		if self.n == 0:
+			return
+		f.write("mean %.12g  stddev %s\n" % (self.mean, str(self.stddev())))
+		f.write("min %.12g  max %.12g\n" % (self.min, self.max))
+		td = dict([(i[0], i[1]) for i in self.tdev()])
+		f.write("%-12s %-14s %-14s %s\n" % ("tau", "adev", "tdev", "n"))
+		for tau, ad, n in self.adev():
+			f.write("%-12.6g %-14.6e %-14s %d\n" % (tau, ad,
+			    "%.6e" % td[tau] if tau in td else "-", n))
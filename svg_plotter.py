@@ -2,6 +2,14 @@
 #
 # A rudimentary pen plotter which outputs SVG files
 #
+# Everything is collected in memory and written out by stop(), with
+# the polylines grouped by pen.  Duplicate points and points in the
+# middle of straight runs are dropped on the way in.
+#
+# A filename ending in ".svgz" gives gzip'ed output.
+#
+
+import gzip
 
 class plotter():
 
@@ -13,13 +21,24 @@ class plotter():
 		self.bgcolor = None
 		self.__pencolor = "black"
 		self.__penwidth = 3
-		self.__started = False
-		self.__up = True
+		self.__symbols = dict()
+		self.__defs = []
+		self.__pens = dict()
+		self.__order = []
+		self.__line = None
+		self.x = 0
+		self.y = 0
+		self.x0 = 999999
+		self.y0 = 999999
+		self.x1 = -999999
+		self.y1 = -999999
 
-		self.fo = open(fname, "w")
-		self.fo.write('<?xml version="1.0" standalone="no"?>\n')
-		self.fo.write('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"\n')
-		self.fo.write('\t"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n')
+		if fname[-5:] == ".svgz":
+			self.fo = gzip.open(fname, "wb")
+			self.__gzip = True
+		else:
+			self.fo = open(fname, "w")
+			self.__gzip = False
 
 	def size(self, width, height):
 		self.width = width
@@ -31,13 +50,6 @@ class plotter():
 	def background(self, col):
 		self.bgcolor = col
 
-	def __setpen(self, first):
-		self.__break()
-		if not first:
-			self.fo.write("</g>")
-		self.fo.write('<g stroke-width="%.1f" stroke="%s">\n' %
-		    (self.__penwidth, self.__pencolor))
-
 	def __bbox(self, x, y):
 		if x > self.x1:
 			self.x1 = x
@@ -48,81 +60,157 @@ class plotter():
 		if y < self.y0:
 			self.y0 = y
 
+	# The list of SVG elements for the current pen
+	def __pen(self):
+		k = (self.__penwidth, self.__pencolor)
+		l = self.__pens.get(k)
+		if l == None:
+			l = []
+			self.__pens[k] = l
+			self.__order.append(k)
+		return l
+
 	def __break(self):
-		if not self.__up:
-			self.fo.write('\t"/>\n')
-			self.__up = True
+		l = self.__line
+		if l == None:
+			return
+		self.__line = None
+		if len(l) == 2:
+			# A dot
+			l[0:0] = [l[0] - .1, l[1] - .1]
+		# The +.01 is to work around a bug in FireFox (seen in 3.5.16)
+		l[0] += .01
+		self.__pen().append('<polyline points="%.2f,%.1f' % (l[0], l[1]) +
+		    " %.1f,%.1f" * (len(l) // 2 - 1) % tuple(l[2:]) + '"/>\n')
 
 	def start(self):
-	
-		self.fo.write('<svg version="1.1"\n')
-		if self.bbox_coord != None:
-			self.fo.write(
-			    '\tviewBox="%.1f %.1f %.1f %.1f"\n' %
-			    self.bbox_coord)
-		if self.width != None:
-			self.fo.write('\twidth="%s" height="%s"\n' %
-			    (self.width, self.height))
-		self.fo.write('\txmlns="http://www.w3.org/2000/svg">\n')
-
-		if self.bgcolor != None:
-			self.fo.write(
-			    '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="%s"/>\n' % (
-			    self.bbox_coord[0],
-			    self.bbox_coord[1],
-			    self.bbox_coord[2] - self.bbox_coord[0],
-			    self.bbox_coord[3] - self.bbox_coord[1],
-			    self.bgcolor))
-
-		self.fo.write('<g stroke-linecap="round"\n')
-		self.fo.write('\t stroke-linejoin="round" fill="none">\n')
-		self.__setpen(True)
-
 		self.x = 0
 		self.y = 0
-		self.x0 = 999999
-		self.y0 = 999999
-		self.x1 = -999999
-		self.y1 = -999999
 
 	def pencolor(self, pencolor):
 		if pencolor == self.__pencolor:
 			return
+		self.__break()
 		self.__pencolor = pencolor
-		self.__setpen(False)
 
 	def penwidth(self, penwidth):
 		if penwidth == self.__penwidth:
 			return
+		self.__break()
 		self.__penwidth = penwidth
-		self.__setpen(False)
 
 	def comment(self, c):
 		self.__break()
-		self.fo.write("<!-- %s -->\n" % c)
+		self.__pen().append("<!-- %s -->\n" % c)
 
 	def vector(self, x, y, draw):
-		if self.x == x and self.y == y:
-			self.x = self.x - .1
-			self.y = self.y - .1
-		# The +.01 is to work around a bug in FireFox (seen in 3.5.16)
-		if draw and self.__up:
-			self.fo.write('<polyline points="%.2f,%.1f' %
-			    (self.x + .01, self.y))
-			self.__up = False
-		if draw:
-			self.fo.write('\n\t%.1f,%.1f' % (x, y))
-		else:
+		if not draw:
 			self.__break()
+		elif self.__line == None:
+			self.__line = [self.x, self.y]
+			if x != self.x or y != self.y:
+				self.__line += [x, y]
+		else:
+			l = self.__line
+			if x != l[-2] or y != l[-1]:
+				if len(l) >= 4:
+					# Drop the middle point of straight runs
+					dx0 = l[-2] - l[-4]
+					dy0 = l[-1] - l[-3]
+					dx1 = x - l[-2]
+					dy1 = y - l[-1]
+					if (dx0 * dy1 == dy0 * dx1 and
+					    dx0 * dx1 + dy0 * dy1 > 0):
+						del l[-2:]
+				l += [x, y]
 		self.x = x
 		self.y = y
-		self.__bbox(x, y)
+		# Same as __bbox(), without a method call per point
+		if x > self.x1:
+			self.x1 = x
+		if x < self.x0:
+			self.x0 = x
+		if y > self.y1:
+			self.y1 = y
+		if y < self.y0:
+			self.y0 = y
+
+	###############################################################
+	# Draw a list of (x, y, draw) strokes, scaled by (sx, sy) and
+	# moved to (x, y).  The first time a name is seen the strokes
+	# are defined as a <symbol>, after that it is just a <use>.
+	def glyph(self, name, strokes, x, y, sx, sy):
+		self.__break()
+		if name not in self.__symbols:
+			self.__symbols[name] = (
+			    min([i[0] for i in strokes]),
+			    min([i[1] for i in strokes]),
+			    max([i[0] for i in strokes]),
+			    max([i[1] for i in strokes]))
+			self.__defs.append(
+			    '<symbol id="%s" overflow="visible">\n' % name)
+			l = []
+			for gx, gy, draw in strokes:
+				if not draw and len(l):
+					self.__symline(l)
+					l = []
+				l.append("%d,%d" % (gx, gy))
+			self.__symline(l)
+			self.__defs.append('</symbol>\n')
+		gx0, gy0, gx1, gy1 = self.__symbols[name]
+		self.__bbox(x + gx0 * sx, y + gy0 * sy)
+		self.__bbox(x + gx1 * sx, y + gy1 * sy)
+		self.__pen().append(
+		    '<use xlink:href="#%s" transform="translate(%.1f,%.1f) scale(%.3f,%.3f)"/>\n'
+		    % (name, x, y, sx, sy))
+
+	def __symline(self, l):
+		if len(l) == 1:
+			l.append(l[0])
+		self.__defs.append('\t<polyline vector-effect="non-scaling-stroke" points="%s"/>\n' % " ".join(l))
 
 	def stop(self):
 		self.__break()
-		self.fo.write("</g>\n")
-		self.fo.write("</g>\n")
-		self.fo.write("</svg>\n")
+		s = []
+		s.append('<?xml version="1.0" standalone="no"?>\n')
+		s.append('<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"\n')
+		s.append('\t"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n')
+		s.append('<svg version="1.1"\n')
+		if self.bbox_coord != None:
+			s.append('\tviewBox="%.1f %.1f %.1f %.1f"\n' %
+			    self.bbox_coord)
+		if self.width != None:
+			s.append('\twidth="%s" height="%s"\n' %
+			    (self.width, self.height))
+		s.append('\txmlns="http://www.w3.org/2000/svg"\n')
+		s.append('\txmlns:xlink="http://www.w3.org/1999/xlink">\n')
+
+		if self.bgcolor != None:
+			s.append(
+			    '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="%s"/>\n' % (
+			    self.bbox_coord[0],
+			    self.bbox_coord[1],
+			    self.bbox_coord[2] - self.bbox_coord[0],
+			    self.bbox_coord[3] - self.bbox_coord[1],
+			    self.bgcolor))
+
+		if len(self.__defs):
+			s.append('<defs>\n')
+			s += self.__defs
+			s.append('</defs>\n')
+
+		s.append('<g stroke-linecap="round"\n')
+		s.append('\t stroke-linejoin="round" fill="none">\n')
+		for k in self.__order:
+			s.append('<g stroke-width="%.1f" stroke="%s">\n' % k)
+			s += self.__pens[k]
+			s.append("</g>\n")
+		s.append("</g>\n")
+		s.append("</svg>\n")
+		s = "".join(s)
+		if self.__gzip:
+			s = s.encode("utf-8")
+		self.fo.write(s)
 		self.fo.close()
 		self.fo = None
 
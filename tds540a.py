@@ -49,13 +49,16 @@ class tds540a(prologix_usb.gpib_dev):
 		self.wr("HARDCOPY:PORT GPIB")
 		self.AOK()
 		self.wr("HARDCOPY start")
-		x = ""
-		while True:
-			y = self.rd()
-			x = x + y
-			if y[-1:] == "\014":
-				break
-		pcl_util.pcl_to_pbm(x, fname)
+		p = pcl_util.pcl_decoder()
+		ok = self.rd_chunks(p.feed, 5)
+		if p.error != None:
+			self.fail("TDS540A hardcopy: " + p.error)
+		if not ok:
+			self.fail("TDS540A hardcopy timed out")
+		if fname[-4:] == ".png":
+			p.png(fname)
+		else:
+			p.pbm(fname)
 			
 
 if __name__ == "__main__":
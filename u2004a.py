@@ -12,6 +12,7 @@ class u2004a(usb488.usb488):
 
 		self.usbdev.default_timeout=7000
 		self.spoll_data = 0x20
+		self.start_listener()
 		self.reset()
 		x = self.ask("*IDN?").split(',')
 		self.id = x[1]
@@ -42,6 +43,11 @@ class u2004a(usb488.usb488):
 			r = True
 		return r
 
+	def srq_enable(self, bits):
+		m = int(self.ask("*SRE?"))
+		self.wr("*SRE %d" % bits)
+		return m
+
 	def config(self, freq=None, level=None, resolution=1):
 		if freq != None:
 			self.wr("FREQ %.0fHz" % freq)
@@ -78,6 +84,59 @@ class u2004a(usb488.usb488):
 			return (True, float(x[1]))
 		return float(x)
 
+	###############################################################
+	# Stream readings, "batch" at a time.
+	#
+	# The sensor takes "batch" (1...50) triggered readings into its
+	# buffer for each INIT, and we wait for the operation complete
+	# SRQ and get them all with a single FETCH?, so no reading is
+	# returned twice and the per cycle overhead is shared by the batch.
+	#
+	# Yields (time.time(), dBm) tuples, n readings or until the
+	# generator is closed if n is None.  The timestamps are spread
+	# evenly over the time from INIT to operation complete.
+	#
+	def stream(self, n=None, freq=None, level=None, resolution=1,
+	    batch=10, tmo=70000):
+		assert 1 <= batch <= 50
+		if n != None:
+			batch = min(batch, n)
+		self.debug("stream() begin")
+		self.config(freq, level, resolution)
+		self.wr("TRIG:SOURCE IMM")
+		self.wr("TRIG:COUN %d" % batch)
+		self.AOK()
+		self.spoll()
+		try:
+			i = 0
+			while n == None or i < n:
+				t0 = time.time()
+				self.wr("INIT:IMM")
+				self.wr("*OPC")
+				# This delay is important, USB bus hangs without it
+				time.sleep(0.100)
+				if not self.wait_spoll(0x20, tmo):
+					self.fail("Timeout waiting for readings")
+				t1 = time.time()
+				x = self.ask("FETCH?").split(",")
+				self.ask("*ESR?")
+				self.spoll()
+				dt = (t1 - t0) / len(x)
+				for j in range(len(x)):
+					if n != None and i >= n:
+						break
+					yield (t0 + (j + 1) * dt, float(x[j]))
+					i += 1
+		finally:
+			# We may be in close(), so no exceptions from here
+			try:
+				self.wr("TRIG:COUN 1")
+				self.wr("TRIG:SOURCE HOLD")
+				self.errors()
+			except Exception as e:
+				self.debug("stream() cleanup failed: " + str(e))
+			self.debug("stream() end")
+
 if __name__ == "__main__":
 	d = u2004a()
 	print("Device reponds: " + d.ask("*IDN?"))
@@ -3,9 +3,14 @@
 from __future__ import print_function
 
 import array
+import errno
 import struct
+import sys
+import threading
 import time
 
+# pyusb 1.0.0 or later: read() takes a buffer, and get_string() has
+# no length argument
 import usb.core
 import usb.util
 
@@ -20,6 +25,20 @@ usbtmc_tab16 = {
 	0x83:	"STATUS_SPLIT_IN_PROGRESS",
 }
 
+if sys.version_info < (3,0):
+	def buf_bytes(a, i, j):
+		return a[i:j].tostring()
+	def buf_put(a, i, m):
+		a[i:i + len(m)] = array.array('B', m.tobytes())
+	buf_str = str
+else:
+	def buf_bytes(a, i, j):
+		return memoryview(a)[i:j]
+	def buf_put(a, i, m):
+		memoryview(a)[i:i + len(m)] = m
+	def buf_str(b):
+		return b.decode("latin-1")
+
 #################################################################################################################################
 # A class to identify a USBTMC device, with optional matching on USBTMC protocol
 # and the USB descriptor strings, which unfortunately, not always give useful info.
@@ -52,13 +71,13 @@ class usbtmc_usbfind(object):
 			if intf.bInterfaceProtocol != self.usbtmc_proto:
 				pass
 			if self.man != None and dev.iManufacturer != 0:
-				if self.man != usb.util.get_string(dev, 100, dev.iManufacturer):
+				if self.man != usb.util.get_string(dev, dev.iManufacturer):
 					return
 			if self.prod != None and dev.iProduct != 0:
-				if self.prod != usb.util.get_string(dev, 100, dev.iProduct):
+				if self.prod != usb.util.get_string(dev, dev.iProduct):
 					return
 			if self.serial != None and dev.iSerialNumber != 0:
-				if self.serial != usb.util.get_string(dev, 100, dev.iSerialNumber):
+				if self.serial != usb.util.get_string(dev, dev.iSerialNumber):
 					return
 			return (cfg, intf)
 
@@ -71,9 +90,9 @@ class usbtmc(object):
 		match = custom_match=usbtmc_usbfind(man, prod, serial)
 		self.usbdev = usb.core.find(custom_match=match)
 		assert self.usbdev != None
-		self.Manufacturer = usb.util.get_string(self.usbdev, 100, self.usbdev.iManufacturer)
-		self.Product = usb.util.get_string(self.usbdev, 100, self.usbdev.iProduct)
-		self.SerialNumber = usb.util.get_string(self.usbdev, 100, self.usbdev.iSerialNumber)
+		self.Manufacturer = usb.util.get_string(self.usbdev, self.usbdev.iManufacturer)
+		self.Product = usb.util.get_string(self.usbdev, self.usbdev.iProduct)
+		self.SerialNumber = usb.util.get_string(self.usbdev, self.usbdev.iSerialNumber)
 		self.debug("USB.M=" + self.Manufacturer)
 		self.debug("USB.P=" + self.Product)
 		self.debug("USB.S=" + self.SerialNumber)
@@ -81,6 +100,11 @@ class usbtmc(object):
 		self.usbdev.set_configuration(self.usbcfg.bConfigurationValue)
 		self.usbtmc_tag = 3
 		self.usbdev.default_timeout=10000
+		# Max bytes per DEV_DEP_MSG_IN transfer, can be set up to
+		# several hundred KB for bulk waveform/trace fetches.
+		self.usbtmc_xfer_size = 65536
+		self.usbtmc_rbuf = None
+		self.usbtmc_wbuf = None
 
 	def usbtmc_get_tag(self):
 		a = self.usbtmc_tag
@@ -99,33 +123,81 @@ class usbtmc(object):
 		l.append(lx & 0xff)             # len
 		l.append((lx >> 8) & 0xff)              
 		l.append((lx >> 16) & 0xff)             
-		l.append((lx >> 32) & 0xff)             
+		l.append((lx >> 24) & 0xff)             
 		return l
 
+	###############################################################
+	# Send a message as DEV_DEP_MSG_OUT transfers of at most
+	# usbtmc_xfer_size bytes, EOM on the last one.  Header and
+	# payload are assembled in one preallocated buffer, which saves
+	# building a new list per transfer; pyusb still copies it on the
+	# way out.
+	#
 	def usbtmc_bulk_out(self, s, tmo=None):
-		l = self.usbtmc_mkmsg(1, len(s))
-		l.append(1)			# EOM
-		l.append(0)			# rsv
-		l.append(0)			# rsv
-		l.append(0)			# rsv
-		for i in s:
-			l.append(ord(i))
-		while len(l) & 0x3 != 0:
-			l.append(0)		# pad
-		self.debug("BULKOUT " + str(l))
-		self.usbdev.write(2, l, timeout=tmo)
+		if not isinstance(s, (bytes, bytearray, memoryview)):
+			s = s.encode("latin-1")
+		m = memoryview(s)
+		lx = self.usbtmc_xfer_size
+		if self.usbtmc_wbuf == None or len(self.usbtmc_wbuf) != lx + 16:
+			self.usbtmc_wbuf = array.array('B', bytearray(lx + 16))
+		b = self.usbtmc_wbuf
+		i = 0
+		while True:
+			n = min(len(m) - i, lx)
+			eom = i + n == len(m)
+			b[0:8] = self.usbtmc_mkmsg(1, n)
+			b[8] = 1 if eom else 0		# EOM
+			b[9] = 0			# rsv
+			b[10] = 0			# rsv
+			b[11] = 0			# rsv
+			buf_put(b, 12, m[i:i + n])
+			t = 12 + n
+			while t & 0x3 != 0:
+				b[t] = 0		# pad
+				t += 1
+			self.debug("BULKOUT %d bytes, EOM %d" % (n, eom))
+			self.usbdev.write(2, buf_bytes(b, 0, t), timeout=tmo)
+			i += n
+			if eom:
+				return
+
+	###############################################################
+	# Read one whole message, looping over DEV_DEP_MSG_IN transfers
+	# until EOM, or until cnt bytes if cnt is given.  Each transfer
+	# lands in the same preallocated buffer and the payloads are
+	# collected in a bytearray.
+	#
+	def usbtmc_bulk_in_raw(self, tmo=None, cnt=None):
+		lx = self.usbtmc_xfer_size
+		if self.usbtmc_rbuf == None or len(self.usbtmc_rbuf) != lx + 16:
+			self.usbtmc_rbuf = array.array('B', bytearray(lx + 16))
+		b = self.usbtmc_rbuf
+		s = bytearray()
+		while True:
+			if cnt != None:
+				if len(s) >= cnt:
+					return s
+				lx = min(lx, cnt - len(s))
+			l = self.usbtmc_mkmsg(2, lx)
+			l.append(0)			# xfer attr
+			l.append(0)			# termchar
+			l.append(0)			# rsv
+			l.append(0)			# rsv
+			self.usbdev.write(2, l, timeout = tmo)
+			n = self.usbdev.read(0x81, b, timeout = tmo)
+			assert n >= 12 or "BULKIN" == "SHORT"
+			assert b[0] == 2 or "BULKIN" == "MSGID"
+			assert b[1] == l[1] or "BULKIN" == "TAG"
+			x = b[4] | (b[5] << 8) | (b[6] << 16) | (b[7] << 24)
+			assert x <= n - 12 or "BULKIN" == "LENGTH"
+			s += buf_bytes(b, 12, 12 + x)
+			self.debug("BULKIN %d bytes, attr 0x%02x" % (x, b[8]))
+			if b[8] & 1:
+				return s
 
 	def usbtmc_bulk_in(self, tmo=None, fail=True):
-		lx = 4096
-		l = self.usbtmc_mkmsg(2, lx)
-		l.append(0)			# xfer attr
-		l.append(0)			# termchar
-		l.append(0)			# rsv
-		l.append(0)			# rsv
-		self.debug("BULKIN? " + str(l))
-		self.usbdev.write(2, l, timeout = tmo)
 		try:
-			x = self.usbdev.read(0x81, lx, timeout = tmo)
+			s = self.usbtmc_bulk_in_raw(tmo)
 		except Exception as foo:
 			self.debug("BULK IN FAILED " + str( foo) + " " + str( foo.args))
 			self.usbtmc_do_clear()
@@ -133,11 +205,7 @@ class usbtmc(object):
 				self.fail("Read stalled")
 			else:
 				return (False, foo.args)
-		l = x[4] | (x[5] << 8) | (x[6] << 16) | (x[7] << 24)
-		s = ""
-		for i in range(0,l):
-			s = s + chr(x[12+i])
-		self.debug("BULKIN " + str(x))
+		s = buf_str(s)
 		if fail:
 			return s
 		else:
@@ -216,6 +284,7 @@ class usb488(pylt.pylt, usbtmc):
 		pylt.pylt.__init__(self)
 		usbtmc.__init__(self, man, prod, serial)
 		self.usb488_tag = 2
+		self.usb488_listener = None
 		self.device_clear()
 
 	def usb488_get_tag(self):
@@ -226,7 +295,10 @@ class usb488(pylt.pylt, usbtmc):
 		return a
 
 	def wr(self, s, tmo=None):
-		self.debug("WR <" + s + ">")
+		if len(s) <= 80:
+			self.debug("WR <" + str(s) + ">")
+		else:
+			self.debug("WR <%d bytes>" % len(s))
 		self.usbtmc_bulk_out(s, tmo=tmo)
 
 	def rd(self, tmo=None, fail=True):
@@ -236,20 +308,155 @@ class usb488(pylt.pylt, usbtmc):
 		self.debug("RD <" + str(s) + ">")
 		return s
 
+	###############################################################
+	# Read a binary response, as a bytearray.  Like the GPIB rd_bin()
+	# it reads cnt bytes, if cnt is None the whole message.
+	def rd_bin(self, cnt=None, tmo=None, fail=True):
+		try:
+			s = self.usbtmc_bulk_in_raw(tmo, cnt)
+		except Exception as foo:
+			self.debug("BULK IN FAILED " + str( foo) + " " + str( foo.args))
+			self.usbtmc_do_clear()
+			if fail:
+				self.fail("Read stalled")
+			return (False, foo.args)
+		self.debug("RD %d bytes" % len(s))
+		if fail:
+			return s
+		return (True, s)
+
+	###############################################################
+	# Interrupt endpoint listener
+	#
+	# A thread reads everything which arrives on endpoint 0x83.
+	# SRQ notifications (bNotify1 = 0x81) wake up wait_srq(),
+	# READ_STATUS_BYTE answers are handed over to spoll().
+	#
+	# If the endpoint fails (device unplugged...) the listener stops
+	# and the error is raised to anybody waiting, until it is
+	# restarted with stop_listener() + start_listener().
+	#
+	def start_listener(self):
+		if self.usb488_listener != None:
+			return
+		self.usb488_cv = threading.Condition()
+		self.usb488_stb = None		# From last SRQ, until spoll()
+		self.usb488_answer = dict()
+		self.usb488_error = None
+		self.usb488_listener = threading.Thread(
+		    target=self.usb488_listen, name="usb488 intr")
+		self.usb488_listener.daemon = True
+		self.usb488_listener.start()
+
+	def stop_listener(self):
+		t = self.usb488_listener
+		self.usb488_listener = None
+		if t != None:
+			t.join()
+
+	def usb488_listen(self):
+		while self.usb488_listener != None:
+			try:
+				z = self.usbdev.read(0x83, 2, timeout=100)
+			except Exception as e:
+				if isinstance(e, usb.core.USBError) and \
+				    getattr(e, "errno", None) == errno.ETIMEDOUT:
+					continue
+				# Anything else ends the listener, and is
+				# raised to whoever waits on it next.
+				self.debug("INTR FAILED " + str(e))
+				with self.usb488_cv:
+					self.usb488_error = e
+					self.usb488_cv.notify_all()
+				return
+			self.debug("INTR " + str(z))
+			if len(z) < 2:
+				continue
+			with self.usb488_cv:
+				if z[0] == 0x81:
+					self.usb488_stb = z[1]
+				elif z[0] & 0x80:
+					self.usb488_answer[z[0] & 0x7f] = z[1]
+				self.usb488_cv.notify_all()
+
+	# Call with usb488_cv held
+	def usb488_check(self):
+		if self.usb488_error != None:
+			self.fail("Interrupt endpoint: " + str(self.usb488_error))
+
+	###############################################################
+	# Serial poll with READ_STATUS_BYTE, which also clears RQS in
+	# the device, so it can send us the next SRQ.  With the listener
+	# running it takes a single control transfer, the answer comes
+	# through the listener.
 	def spoll(self):
-		t = self.usbtmc_get_tag() & 0x7f
+		if self.usb488_listener == None:
+			return self.spoll_pipes()
+		with self.usb488_cv:
+			self.usb488_check()
+			self.usb488_stb = None
+		t = self.usb488_get_tag()
+		x = self.usbdev.ctrl_transfer( 0xa1, 128, t, 0, 3, 1000)
+		assert x[0] == 1 or "SPOLL" == "STATUS"
+		assert x[1] == t or "SPOLL" == "TAG"
+		te = time.time() + 1
+		with self.usb488_cv:
+			while t not in self.usb488_answer:
+				self.usb488_check()
+				dt = te - time.time()
+				assert dt > 0 or "SPOLL" == "INTR TIMEOUT"
+				self.usb488_cv.wait(dt)
+			z = self.usb488_answer.pop(t)
+		self.debug("SPOLL " + str(x) + " ==> 0x%02x" % z)
+		return z
+
+	def spoll_pipes(self):
+		t = self.usb488_get_tag()
 		self.debug("SPOLL begin (%02x)" % t)
 		self.usbtmc_do_check_pipes()
 		try:
 			x = self.usbdev.ctrl_transfer( 0xa1, 128, t, 0, 3, 1000)
 		except:
 			x = self.usbdev.ctrl_transfer( 0xa1, 128, t, 0, 3, 1000)
-		z = self.usbdev.read(0x83, 2, None, 1000)
+		while True:
+			z = self.usbdev.read(0x83, 2, timeout=1000)
+			if z[0] != 0x81:
+				break
+			# Stale SRQ notification, not our status byte
+			self.debug("SPOLL skip SRQ " + str(z))
 		self.debug("SPOLL " + str(x) + str(z) + " ==> 0x%02x" % z[1])
 		assert x[0] == 1 or "SPOLL" == "STATUS"
 		assert x[1] == t or "SPOLL" == "TAG"
 		assert (z[0]&0x7f) == t or "SPOLL" == "INTR TAG"
 		return z[1]
 
+	###############################################################
+	# SRQ arrives as a notification on the interrupt endpoint,
+	# bNotify1 = 0x81 and bNotify2 = the status byte.
+	def wait_srq(self, tmo):
+		te = time.time() + tmo * 1e-3
+		if self.usb488_listener != None:
+			with self.usb488_cv:
+				while self.usb488_stb == None:
+					self.usb488_check()
+					dt = te - time.time()
+					if dt <= 0:
+						return False
+					self.usb488_cv.wait(dt)
+			return True
+		while True:
+			t = int((te - time.time()) * 1e3)
+			if t <= 0:
+				return False
+			try:
+				z = self.usbdev.read(0x83, 2, timeout=t)
+			except usb.core.USBError as e:
+				if getattr(e, "errno", None) == errno.ETIMEDOUT:
+					return False
+				raise
+			self.debug("INTR " + str(z))
+			if z[0] == 0x81:
+				return True
+
 	def device_clear(self):
 		self.usbtmc_do_clear()